@@ -1,21 +1,88 @@
 from sqlalchemy import create_engine, inspect
 import pandas as pd
 import datetime
+import logging
+import threading
+from contextlib import nullcontext
+
+# process wide engines by connection string and the pool settings they were created with, see get_engine
+_engines = {}
+_engine_settings = {}
+_engines_lock = threading.Lock()
+# pool settings of get_engine, DatabaseHandler takes overrides from [database.pool]
+POOL_DEFAULTS = {'pool_size': 5, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 3600}
+
+def get_engine(conn_string, pool_size=None, max_overflow=None, pool_pre_ping=None, pool_recycle=None):
+    """A function to get the process wide engine for a connection string, created on first use.
+    Pool settings only apply when the engine is created, a later call asking for other
+    settings gets the existing engine and a warning.
+
+    Args:
+        conn_string (str): connection string for database
+        pool_size (int, optional): connections kept open. Defaults to 5.
+        max_overflow (int, optional): extra connections allowed under load. Defaults to 10.
+        pool_pre_ping (bool, optional): test connections before use. Defaults to True.
+        pool_recycle (int, optional): seconds before a connection is replaced. Defaults to 3600.
+
+    Returns:
+        sqlalchemy.engine.Engine: shared engine
+    """
+    requested = {k: v for k, v in {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_pre_ping': pool_pre_ping,
+                                   'pool_recycle': pool_recycle}.items() if v is not None}
+    with _engines_lock:
+        if conn_string not in _engines:
+            settings = {**POOL_DEFAULTS, **requested}
+            _engines[conn_string] = create_engine(conn_string, **settings)
+            _engine_settings[conn_string] = settings
+        else:
+            created = _engine_settings[conn_string]
+            differ = {k: v for k, v in requested.items() if created[k] != v}
+            if differ:
+                logging.getLogger(__name__).warning(f'engine for {_engines[conn_string].url!r} already exists, '
+                                                    f'ignoring {differ}, it was created with {created}')
+        return _engines[conn_string]
+
+def pool_status():
+    """A function to report connection pool statistics for every shared engine
+
+    Returns:
+        dict: connection string, password hidden, and dict with size, checked_in, checked_out and overflow
+    """
+    with _engines_lock:
+        return {repr(e.url): {'size': e.pool.size(), 'checked_in': e.pool.checkedin(),
+                              'checked_out': e.pool.checkedout(), 'overflow': e.pool.overflow()}
+                for e in _engines.values()}
 
 class DatabaseHandler:
     """A Class to handle database management during ETL
     """
 
-    def __init__(self, conn_string, data = pd.DataFrame):
+    def __init__(self, conn_string, data = pd.DataFrame, memory_tracker = None, engine_kwargs = None):
         """Constructor for object
 
         Args:
             conn_string (str): connection string for database
             data (pd.DataFrame, optional): Dataframe to send to database. Defaults to pd.DataFrame.
+            memory_tracker (performance.StageMemory, optional): attribute memory to the row_hash, to_sql and merge stages. Defaults to None.
+            engine_kwargs (dict, optional): pool_size, max_overflow, pool_pre_ping and pool_recycle, see get_engine. Defaults to None.
         """
-        # create engine
-        self.engine = create_engine(conn_string)
+        # get shared engine
+        self.engine = get_engine(conn_string, **(engine_kwargs or {}))
         self.data = data
+        self.memory_tracker = memory_tracker
+
+    def _stage(self, name):
+        """A method to open a memory stage on memory_tracker
+
+        Args:
+            name (str): stage name
+
+        Returns:
+            context manager: stage of memory_tracker, or a no-op without one
+        """
+        if self.memory_tracker is None:
+            return nullcontext()
+        return self.memory_tracker.stage(name)
 
     def append_data(self, target, schema, batch = True):
         """A method to append data to database. Creates batch date by default.
@@ -34,7 +101,7 @@ class DatabaseHandler:
         # append data to table    
         self.data.to_sql(target, schema=schema, con=self.engine, if_exists='append', index=False)
 
-    def merge_data(self, source, target, schema, query, batch = True):
+    def merge_data(self, source, target, schema, query, batch = True, row_hash = False):
         """A method to run SQL statement to merge data between staging and destination tables.
             Creates batch date by default.
 
@@ -44,28 +111,59 @@ class DatabaseHandler:
             schema (str): database schema
             query (dict): a dictionary to read sql based on type
             batch (bool, optional): flag to create batch data. Defaults to True.
+            row_hash (bool, optional): flag to add row_hash column so the query can skip unchanged rows. Defaults to False.
+
+        Returns:
+            dict: row counts returned by the query, for example inserted, updated and unchanged. None if query returns no rows.
         """
         # get query
         raw_query = self.format_query(query)
+        # hash row values before batch date is added so unchanged rows hash the same every run
+        if row_hash:
+            with self._stage('row_hash'):
+                hashes = self.row_hash(self.data)
         # create timestamp
         if batch:
             self.data['batch_date'] = datetime.datetime.now()
         else:
             pass
+        # row_hash is the last column, after batch_date
+        if row_hash:
+            self.data['row_hash'] = hashes
         # empty table if exists, just in case
         if inspect(self.engine).has_table(source):
             with self.engine.connect() as con:
                 rs = con.execute(f"truncate table {source}")
         # load source data
-        self.data.to_sql(source, con=self.engine, schema=schema, if_exists='append', index=False)
+        with self._stage('to_sql'):
+            self.data.to_sql(source, con=self.engine, schema=schema, if_exists='append', index=False)
         # create target if not exist
         if inspect(self.engine).has_table(target) == False:
             self.data.to_sql(target, schema=schema, con=self.engine, if_exists='append', index=False)
         else:
             pass
         # run merge query
-        with self.engine.connect() as con:
+        counts = None
+        with self._stage('merge'), self.engine.begin() as con:
             rs = con.execute(raw_query)
+            if rs.returns_rows:
+                counts = dict(rs.fetchone()._mapping)
+        # clear staging once merged
+        with self.engine.begin() as con:
+            con.execute(f"truncate table {source}")
+        return counts
+
+    @staticmethod
+    def row_hash(df):
+        """A method to hash every row of a dataframe from its text values
+
+        Args:
+            df (pd.DataFrame): rows to hash
+
+        Returns:
+            numpy.ndarray: int64 hash per row
+        """
+        return pd.util.hash_pandas_object(df.fillna('').astype(str), index=False).values.view('int64')
 
     def format_query(self, query_dict):
         """_summary_
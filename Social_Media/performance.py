@@ -0,0 +1,146 @@
+import os
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+
+class StageMemory:
+    """Class to attribute memory to named stages with tracemalloc. Every stage records the
+    peak traced memory above its start, stages with the same name are aggregated. Tracing
+    slows allocations down, so this is opt-in.
+    Stages should run on one thread, allocations of other threads are counted in the
+    stage that is open at the time.
+
+    With sites the call sites that allocated the most are recorded too. This takes a
+    snapshot of all traced allocations whenever a stage closes and compares it to the
+    previous one, so a stage gets the allocations since the last stage closed. Snapshots
+    are slow for large heaps, keep sites off for stages that run per batch in production.
+
+    Social_Media is deployed on its own without DADPy, so this is a standard library only
+    copy of DADPy.etl.memory.StageMemory.
+
+    Example:
+
+    memory = StageMemory()
+    memory.start()
+    with memory.stage('read_csv'):
+        --- your run code ---
+    memory.stop()
+    report = memory.summary()
+    """
+    def __init__(self, top=5, frames=1, sites=False):
+        """Instance Attributes
+
+        Args:
+            top (int, optional): call sites kept per stage. Defaults to 5.
+            frames (int, optional): frames traced per allocation. Defaults to 1.
+            sites (bool, optional): record the top allocating call sites of every stage. Defaults to False.
+        """
+        self.top = top
+        self.frames = frames
+        self.sites = sites
+        self.stages = {}
+        self._open = []
+        self._baseline = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """A method to start tracing allocations, if they are not traced already
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+
+    def stop(self):
+        """A method to stop tracing allocations, if start began tracing
+        """
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._baseline = None
+
+    def reset(self):
+        """A method to clear the recorded stages
+        """
+        with self._lock:
+            self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """A context manager to record the memory of a named stage
+
+        Args:
+            name (str): stage name, e.g. read_csv or to_sql
+        """
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        if self.sites and self._baseline is None:
+            # first stage since tracing started, later stages compare to the previous close
+            self._baseline = self._snapshot()
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # keep the peak of the enclosing stages before it is reset for this one
+            for entry in self._open:
+                entry['peak'] = max(entry['peak'], peak)
+            tracemalloc.reset_peak()
+            entry = {'start': current, 'peak': current}
+            self._open.append(entry)
+        try:
+            yield
+        finally:
+            snapshot = self._snapshot() if self.sites else None
+            with self._lock:
+                current, peak = tracemalloc.get_traced_memory()
+                entry['peak'] = max(entry['peak'], peak)
+                self._open.remove(entry)
+                for parent in self._open:
+                    parent['peak'] = max(parent['peak'], entry['peak'])
+                record = self.stages.setdefault(name, {'calls': 0, 'peak_mb': 0.0, 'net_mb': 0.0, 'sites': Counter()})
+                record['calls'] = record['calls'] + 1
+                record['peak_mb'] = max(record['peak_mb'], (entry['peak'] - entry['start']) / 1024 ** 2)
+                record['net_mb'] = record['net_mb'] + (current - entry['start']) / 1024 ** 2
+                if snapshot is not None and self._baseline is not None:
+                    for site in snapshot.compare_to(self._baseline, 'lineno')[:self.top]:
+                        if site.size_diff >= 1024:
+                            frame = site.traceback[0]
+                            record['sites'][f'{os.path.basename(frame.filename)}:{frame.lineno}'] += site.size_diff
+                    self._baseline = snapshot
+
+    @staticmethod
+    def _snapshot():
+        """Private method to snapshot traced allocations without those of tracemalloc and this module
+
+        Returns:
+            tracemalloc.Snapshot: filtered snapshot
+        """
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__)))
+
+    def report(self):
+        """A method to list the recorded stages
+
+        Returns:
+            list: dictionaries with stage, calls, peak_mb, net_mb and the top allocating sites in MB, highest peak first
+        """
+        with self._lock:
+            stages = [{'stage': name,
+                       'calls': record['calls'],
+                       'peak_mb': round(record['peak_mb'], 2),
+                       'net_mb': round(record['net_mb'], 2),
+                       'sites': [(site, round(size / 1024 ** 2, 3)) for site, size in record['sites'].most_common(self.top)]}
+                      for name, record in self.stages.items()]
+        return sorted(stages, key=lambda item: item['peak_mb'], reverse=True)
+
+    def summary(self):
+        """A method to format the recorded stages as text, one line per stage
+
+        Returns:
+            str: stage peaks and top allocating sites, None if no stage was recorded
+        """
+        lines = [f"{item['stage']} x{item['calls']} peak {item['peak_mb']} MB"
+                 + (': ' + ', '.join(f'{site} +{size} MB' for site, size in item['sites']) if item['sites'] else '')
+                 for item in self.report()]
+        return '\n'.join(lines) if lines else None
@@ -0,0 +1,6 @@
+/*
+    Add the row_hash column used by reddit_merge_row_hash.sql. Safe to run more than once.
+    Rows merged before the column existed have a null hash and are updated on their next merge.
+*/
+alter table reddit_cities add column if not exists row_hash bigint;
+alter table z_reddit_cities add column if not exists row_hash bigint;
\ No newline at end of file
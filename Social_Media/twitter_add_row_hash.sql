@@ -0,0 +1,6 @@
+/*
+    Add the row_hash column used by twitter_merge_row_hash.sql. Safe to run more than once.
+    Rows merged before the column existed have a null hash and are updated on their next merge.
+*/
+alter table twitter_cities add column if not exists row_hash bigint;
+alter table z_twitter_cities add column if not exists row_hash bigint;
\ No newline at end of file
@@ -0,0 +1,37 @@
+/*
+    Merge z_twitter_cities into twitter_cities. Rows are only updated when row_hash changed,
+    run with DatabaseHandler.merge_data(..., row_hash=True), or row_hash = true in the config.
+    Both tables need the row_hash column, run twitter_add_row_hash.sql once before switching.
+    Returns inserted, updated and unchanged row counts. DatabaseHandler truncates z_twitter_cities afterwards.
+*/
+with updated as (
+    update twitter_cities
+    set id = z_twitter_cities.id,
+        created_at = to_timestamp(z_twitter_cities.created_at, 'YYYY-MM-DD THH24:MI:SSZ'),
+        text = z_twitter_cities.text,
+        possibly_sensitive = z_twitter_cities.possibly_sensitive,
+        search_string = z_twitter_cities.search_string,
+        batch_date = z_twitter_cities.batch_date,
+        row_hash = z_twitter_cities.row_hash
+    from z_twitter_cities
+    where twitter_cities.id = z_twitter_cities.id
+    and twitter_cities.row_hash is distinct from z_twitter_cities.row_hash
+    returning 1
+),
+inserted as (
+    insert into twitter_cities as tgt
+    select src.id  
+        ,to_timestamp(src.created_at, 'YYYY-MM-DD THH24:MI:SSZ') 
+        ,src.text
+        ,src.possibly_sensitive
+        ,src.search_string
+        ,src.batch_date
+        ,src.row_hash
+    from z_twitter_cities src
+    left outer join twitter_cities tgt on src.id = tgt.id 
+    where tgt.id is null
+    returning 1
+)
+select (select count(*) from inserted) as inserted,
+    (select count(*) from updated) as updated,
+    (select count(*) from z_twitter_cities) - (select count(*) from inserted) - (select count(*) from updated) as unchanged;
\ No newline at end of file
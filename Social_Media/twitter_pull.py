@@ -1,6 +1,8 @@
 import os
 import twitter_backend
 import db
+import performance
+import json
 import datetime
 import pandas as pd
 import logging
@@ -27,6 +29,11 @@ def main(config_path):
         datefmt='%Y-%m-%d %H:%M:%S', encoding='utf-8', level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
     log = logging.getLogger('apipull')
     
+    # opt-in memory attribution, stages are no-ops unless tracing is started
+    memory = performance.StageMemory(sites=config.get('profiling', {}).get('memory_sites', False))
+    if config.get('profiling', {}).get('memory', False):
+        memory.start()
+
     try:
         log.info('setting up processing variables')
         # set up query date
@@ -44,17 +51,20 @@ def main(config_path):
         for search in search_list: 
             log.info(f'pulling tweets for #{search}')  
             search_obj = twitter_backend.TwitterAPI(f'#{search}', query_date)
-            search_obj.search_tweets()
+            with memory.stage('pull'):
+                search_obj.search_tweets()
             search_objs.append(search_obj)
 
         log.info('converting results to dataframe')
         # transform search results into dataframe
-        df = pd.concat([x.frame_tweets() for x in search_objs])
-        df = df.reset_index(drop=True)
+        with memory.stage('frame'):
+            df = pd.concat([x.frame_tweets() for x in search_objs])
+            df = df.reset_index(drop=True)
 
         # send data for file
         data_path = config['paths']['data_path']
-        df.to_json(os.path.join(data_path,f'twitter_pull_{download_date}.json'))
+        with memory.stage('to_json'):
+            df.to_json(os.path.join(data_path,f'twitter_pull_{download_date}.json'))
         log.info(f"total records pulled: {len(df)}")
 
         log.info('uploading records to database')
@@ -62,10 +72,20 @@ def main(config_path):
         target_arg= config['database']['target_table']
         schema_arg = config['database']['schema']
         query_arg = config['database']['query']
+        row_hash_arg = config['database'].get('row_hash', False)
 
         # send records to database
-        db_obj = db.DatabaseHandler(config['database']['connection_string'], df)
-        db_obj.merge_data(staging_arg, target_arg, schema_arg, query_arg, True)
+        db_obj = db.DatabaseHandler(config['database']['connection_string'], df, memory_tracker=memory,
+                                    engine_kwargs=config['database'].get('pool'))
+        counts = db_obj.merge_data(staging_arg, target_arg, schema_arg, query_arg, True, row_hash=row_hash_arg)
+        log.info(f"merge results: {counts}")
+
+        # persist memory stages next to the log
+        if memory.stages:
+            log.info(f"memory stages:\n{memory.summary()}")
+            with open(os.path.join(log_path, f'twitter_pull_{download_date}_memory.json'), 'w') as fp:
+                json.dump(memory.report(), fp, indent=1)
+            memory.stop()
 
         log.info('etl finished')
 
@@ -9,45 +9,59 @@ Overview:
     - The script scrapes data about dog breeds from the VCA website, extracts relevant information, cleans the data, and loads it into a MongoDB database.
     - Configuration settings are read from 'config.toml' to customize the behavior of the script.
     - Logging is utilized to track the progress of the ETL process and capture any errors that may occur.
+    - Importing the script does no work. Config and logging are set up in main, and the scraper, duckdb and pymongo are imported by the step that uses them, so --help and --dry-run start without loading them.
 
 """
 
+import argparse
 import json
-import toml
-import vca
 import os
 import logging
-import duckdb
 import sys
-from datetime import datetime
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-
-# Load runtime variables from configuration file
-with open('.\\config.toml', 'r') as f:
-    config = toml.load(f)
-username = config['mongodb']['username']
-password = config['mongodb']['password']
-cluster = config['mongodb']['cluster']
-app_name = config['mongodb']['app_name']
-export_path = config['scraper']['export_path']
-log_path = config['log']['log_path']
-
-# Set up logging configuration
-logging.basicConfig(filename=os.path.join(log_path, 'etl.log'), filemode='w', format='%(asctime)s | %(levelname)s | %(message)s')
+
 log = logging.getLogger()
-log.setLevel(logging.INFO)
 
-def get_data():
+STEPS = ['get', 'clean', 'upload']
+
+def load_config(path='.\\config.toml'):
+    """
+    Loads runtime variables from the configuration file.
+
+    Args:
+        path (str): path of the TOML configuration file.
+
+    Returns:
+        dict: configuration settings.
+    """
+    import toml
+    with open(path, 'r') as f:
+        return toml.load(f)
+
+def setup_logging(log_path):
+    """
+    Sets up logging configuration.
+
+    Args:
+        log_path (str): directory of the log file.
+    """
+    logging.basicConfig(filename=os.path.join(log_path, 'etl.log'), filemode='w', format='%(asctime)s | %(levelname)s | %(message)s')
+    log.setLevel(logging.INFO)
+
+def get_data(config):
     """
     Scrapes data from the VCA website and exports it to a JSON file.
 
     This function initializes a VCA scraper object, fetches breed information and details from the VCA website, and dumps the scraped data into a JSON file.
 
+    Args:
+        config (dict): configuration settings.
+
     Returns:
         None
     """
+    export_path = config['scraper']['export_path']
     try:
+        import vca
         log.info('Scraping data from VCA website...')
         # Initialize VCA Scraper
         scraper = vca.VCAScrape(export_path)
@@ -63,16 +77,21 @@ def get_data():
         log.error(f'Error scraping data from VCA: {e}')
         sys.exit()
 
-def clean_data():
+def clean_data(config):
     """
     Cleans the scraped data.
 
     This function reads the scraped data from the JSON file, performs cleaning operations using a SQL script, and exports the cleaned data to a new JSON file.
 
+    Args:
+        config (dict): configuration settings.
+
     Returns:
         None
     """
+    export_path = config['scraper']['export_path']
     try:
+        import duckdb
         log.info('Cleaning data...')
         # Read JSON data into a DuckDB DataFrame
         vca = duckdb.read_json('.\\vca_detail.json')
@@ -88,7 +107,7 @@ def clean_data():
         log.error(f'Error cleaning data: {e}')
         sys.exit()
 
-def upload_data():
+def upload_data(config):
     """
     Uploads data from a JSON file to a MongoDB database.
 
@@ -97,13 +116,20 @@ def upload_data():
     inserts the data into the 'vca' collection, creates an index on the 'breed' field, and prints the total number of
     records inserted into the collection.
 
+    Args:
+        config (dict): configuration settings.
+
     Returns:
         None
     """
+    mongodb = config['mongodb']
+    export_path = config['scraper']['export_path']
     try:
+        from pymongo.mongo_client import MongoClient
+        from pymongo.server_api import ServerApi
         log.info('Setting up database connection...')
         # Create MongoDB connection URI
-        uri = f"mongodb+srv://{username}:{password}@{cluster}/?retryWrites=true&w=majority&appName={app_name}"
+        uri = f"mongodb+srv://{mongodb['username']}:{mongodb['password']}@{mongodb['cluster']}/?retryWrites=true&w=majority&appName={mongodb['app_name']}"
         with MongoClient(uri, server_api=ServerApi('1')) as client:
             # Connect to MongoDB and drop existing collection
             db = client.dogs_nlp
@@ -126,8 +152,30 @@ def upload_data():
         log.error(f'Error inserting data to MongoDB: {e}')
         sys.exit()
 
+def main(argv=None):
+    """
+    Runs the selected ETL steps.
+
+    Args:
+        argv (list): command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description='Scrape VCA breed data, clean it and upload it to MongoDB.')
+    parser.add_argument('--config', default='.\\config.toml', help='TOML configuration file')
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=STEPS, help='steps to run, in order')
+    parser.add_argument('--dry-run', action='store_true', help='list the steps that would run and exit')
+    args = parser.parse_args(argv)
+
+    steps = [step for step in STEPS if step in args.steps]
+    if args.dry_run:
+        print('\n'.join(steps))
+        return
+
+    config = load_config(args.config)
+    setup_logging(config['log']['log_path'])
+    functions = {'get': get_data, 'clean': clean_data, 'upload': upload_data}
+    for step in steps:
+        functions[step](config)
+
 
 if __name__ == "__main__":
-    get_data()
-    clean_data()
-    upload_data()
\ No newline at end of file
+    main()
\ No newline at end of file
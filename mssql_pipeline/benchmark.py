@@ -0,0 +1,335 @@
+"""Load throughput benchmarks for MyDatabase against a SQLite or PostgreSQL stand-in.
+
+Example:
+
+python -m DADPy.etl.benchmark --url sqlite:///C:\\Example_Data\\bench.sqlite --rows 200000 --columns 20 --chunksizes 10000 50000 --readers c arrow
+python -m DADPy.etl.benchmark --url sqlite:///C:\\Example_Data\\bench.sqlite --compare benchmark_base.json
+"""
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import pandas as pd
+from .db import MyDatabase
+from .performance import ResourceSampler, summarize_samples
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# column types cycled across the width of generated files
+COLUMN_TYPES = ('int', 'float', 'text', 'date')
+
+def generate_csv(file, rows, columns, distribution='uniform', null_ratio=0.0, text_length=12, seed=0, sep=',', prefix='col'):
+    """Write a synthetic csv file, the columns cycle through int, float, text and date values
+
+    Args:
+        file (str): output file
+        rows (int): data rows
+        columns (int): columns
+        distribution (str, optional): 'uniform' values, 'skewed' values where a few repeat often,
+            or 'wide' text of up to 10 times text_length. Defaults to 'uniform'.
+        null_ratio (float, optional): share of empty values. Defaults to 0.0.
+        text_length (int, optional): characters of text values. Defaults to 12.
+        seed (int, optional): random seed, the same seed writes the same file. Defaults to 0.
+        sep (str, optional): delimiter. Defaults to ','.
+        prefix (str, optional): column names are prefix followed by the position. Defaults to 'col'.
+
+    Raises:
+        ValueError: Unknown distribution
+
+    Returns:
+        dict: file, rows, columns, distribution, null_ratio and bytes written
+    """
+    if distribution not in ('uniform', 'skewed', 'wide'):
+        raise ValueError(f'Unknown distribution: {distribution}')
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    # skewed values are drawn from small pools with a long tail
+    pool = [''.join(rng.choices(letters, k=text_length)) for _ in range(50)]
+    start = datetime.date(2000, 1, 1)
+    types = [COLUMN_TYPES[i % len(COLUMN_TYPES)] for i in range(columns)]
+
+    def value(kind):
+        if null_ratio and rng.random() < null_ratio:
+            return ''
+        if distribution == 'skewed':
+            rank = min(int(rng.paretovariate(1.2)), len(pool)) - 1
+            if kind == 'int':
+                return str(rank)
+            if kind == 'float':
+                return f'{rank * 1.5:.2f}'
+            if kind == 'date':
+                return (start + datetime.timedelta(days=rank)).isoformat()
+            return pool[rank]
+        if kind == 'int':
+            return str(rng.randint(-2 ** 31, 2 ** 31 - 1))
+        if kind == 'float':
+            return f'{rng.uniform(-1e6, 1e6):.4f}'
+        if kind == 'date':
+            return (start + datetime.timedelta(days=rng.randint(0, 9000))).isoformat()
+        length = rng.randint(1, text_length * 10) if distribution == 'wide' else text_length
+        return ''.join(rng.choices(letters, k=length))
+
+    with open(file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=sep)
+        writer.writerow([f'{prefix}{i + 1}' for i in range(columns)])
+        for _ in range(rows):
+            writer.writerow([value(kind) for kind in types])
+    return {'file': file, 'rows': rows, 'columns': columns, 'distribution': distribution, 'null_ratio': null_ratio,
+            'bytes': os.path.getsize(file)}
+
+def _measure(run, interval=0.05):
+    """Private function to run a benchmark case while sampling resident memory
+
+    Args:
+        run (callable): benchmark case returning a dict
+        interval (float, optional): seconds between memory samples. Defaults to 0.05.
+
+    Returns:
+        dict: result of run with seconds and peak_rss_mb
+    """
+    sampler = ResourceSampler(interval=interval, capacity=100000)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        result = run()
+    finally:
+        seconds = time.perf_counter() - start
+        samples = sampler.stop()
+    result['seconds'] = round(seconds, 3)
+    result['peak_rss_mb'] = round(max((s['rss_mb'] for s in samples), default=0.0), 2)
+    return result
+
+def _drop_table(database, table):
+    with database.engine.begin() as con:
+        con.execute(f'drop table if exists {table}')
+
+def bench_update(url, file, table, rows, chunksize, reader, workers=1, schema=None, log=None):
+    """Benchmark MyDatabase.update_database into a new table
+
+    Args:
+        url (str): sqlalchemy url of the stand-in database
+        file (str): csv file
+        table (str): target table, dropped before the run
+        rows (int): data rows in file
+        chunksize (int): rows per batch
+        reader (str): csv reader, see make_reader
+        workers (int, optional): writer threads. Defaults to 1.
+        schema (str, optional): database schema, None for SQLite. Defaults to None.
+        log (logging, optional): log. Defaults to the module logger.
+
+    Returns:
+        dict: case parameters, rows_per_second, peak_rss_mb and batch latency percentiles in milliseconds
+    """
+    log = log or logging.getLogger(__name__)
+    database = MyDatabase(None, None, log, schema=schema, url=url)
+    _drop_table(database, table)
+    file_kwargs = {'sep': ',', 'dtype': str, 'chunksize': chunksize}
+    result = _measure(lambda: {'summary': database.update_database(table, file, file_kwargs=file_kwargs, reader=reader,
+                                                                   workers=workers)})
+    summary = result.pop('summary')
+    # milliseconds, batches on a SQLite stand-in often take less than 10 ms
+    latency = summarize_samples([seconds * 1000 for seconds in summary['batch_seconds']], digits=3)
+    return {'case': 'update_database', 'chunksize': chunksize, 'reader': reader, 'workers': workers,
+            'rows': summary['rows'], 'batches': summary['batches'], 'seconds': result['seconds'],
+            'rows_per_second': round(rows / result['seconds'], 1) if result['seconds'] else None,
+            'peak_rss_mb': result['peak_rss_mb'],
+            'batch_p50_ms': latency['p50'], 'batch_p95_ms': latency['p95'], 'batch_p99_ms': latency['p99']}
+
+def bench_merge(url, file, table, rows, chunksize, reader, schema='dbo', log=None):
+    """Benchmark MyDatabase.merge_data with isolated staging and the python merge. MERGE is T-SQL,
+    so this needs a SQL Server url and an existing target table with z_merge_columns metadata.
+
+    Args:
+        url (str): sqlalchemy url of a SQL Server test database
+        file (str): csv file with COL1, COL2 ... headers
+        table (str): target table
+        rows (int): data rows in file
+        chunksize (int): rows per staging batch
+        reader (str): csv reader, see make_reader
+        schema (str, optional): database schema. Defaults to 'dbo'.
+        log (logging, optional): log. Defaults to the module logger.
+
+    Returns:
+        dict: case parameters, rows_per_second, peak_rss_mb and merge chunk latency percentiles in milliseconds
+    """
+    log = log or logging.getLogger(__name__)
+    database = MyDatabase(None, None, log, schema=schema, url=url)
+    file_kwargs = {'sep': ',', 'dtype': str, 'chunksize': chunksize}
+    result = _measure(lambda: {'chunks': database.merge_data(table, file, file_kwargs=file_kwargs, reader=reader,
+                                                             staging='isolated', merge='python')})
+    latency = summarize_samples([chunk['seconds'] * 1000 for chunk in result.pop('chunks') or []], digits=3)
+    return {'case': 'merge_data', 'chunksize': chunksize, 'reader': reader, 'workers': 1, 'rows': rows,
+            'seconds': result['seconds'],
+            'rows_per_second': round(rows / result['seconds'], 1) if result['seconds'] else None,
+            'peak_rss_mb': result['peak_rss_mb'],
+            'batch_p50_ms': latency['p50'], 'batch_p95_ms': latency['p95'], 'batch_p99_ms': latency['p99']}
+
+def bench_schema_check(url, sources, reader, schema=None, log=None):
+    """Benchmark MyDatabase.schema_check over sources loaded by bench_update
+
+    Args:
+        url (str): sqlalchemy url of the stand-in database
+        sources (dict): table name and csv file
+        reader (str): csv reader, see make_reader
+        schema (str, optional): database schema, None for SQLite. Defaults to None.
+        log (logging, optional): log. Defaults to the module logger.
+
+    Returns:
+        dict: case parameters, sources_per_second and peak_rss_mb
+    """
+    log = log or logging.getLogger(__name__)
+    database = MyDatabase(None, None, log, schema=schema, url=url)
+    file_kwargs = {'sep': ',', 'dtype': str, 'nrows': 2}
+    result = _measure(lambda: {'diffs': database.schema_check(sources, file_kwargs=file_kwargs, reader=reader,
+                                                              raise_on_change=False)})
+    result.pop('diffs')
+    return {'case': 'schema_check', 'chunksize': None, 'reader': reader, 'workers': 1, 'sources': len(sources),
+            'seconds': result['seconds'],
+            'sources_per_second': round(len(sources) / result['seconds'], 1) if result['seconds'] else None,
+            'peak_rss_mb': result['peak_rss_mb']}
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(url, rows=100000, columns=20, chunksizes=(10000, 50000), readers=('c', 'arrow'), workers=(1,),
+              distribution='uniform', null_ratio=0.0, merge_table=None, schema=None, data_dir=None, seed=0, log=None):
+    """Generate a synthetic file and benchmark update_database for every chunk size, reader and
+    worker count, then schema_check, and merge_data when merge_table is given
+
+    Args:
+        url (str): sqlalchemy url of the stand-in database
+        rows (int, optional): data rows. Defaults to 100000.
+        columns (int, optional): columns. Defaults to 20.
+        chunksizes (tuple, optional): chunk sizes. Defaults to (10000, 50000).
+        readers (tuple, optional): csv readers. Defaults to ('c', 'arrow').
+        workers (tuple, optional): writer thread counts. Defaults to (1,).
+        distribution (str, optional): value distribution, see generate_csv. Defaults to 'uniform'.
+        null_ratio (float, optional): share of empty values. Defaults to 0.0.
+        merge_table (str, optional): SQL Server table to benchmark merge_data against. Defaults to None.
+        schema (str, optional): database schema, None for SQLite. Defaults to None.
+        data_dir (str, optional): directory for generated files. Defaults to a temporary directory.
+        seed (int, optional): random seed. Defaults to 0.
+        log (logging, optional): log. Defaults to the module logger.
+
+    Returns:
+        dict: environment, parameters and one result per case
+    """
+    log = log or logging.getLogger(__name__)
+    data_dir = data_dir or tempfile.mkdtemp(prefix='mssql_pipeline_bench_')
+    file = os.path.join(data_dir, f'bench_{rows}x{columns}_{distribution}.csv')
+    source = generate_csv(file, rows, columns, distribution, null_ratio, seed=seed)
+    log.info(f"generated {file}: {source['bytes']} bytes")
+    results = []
+    sources = {}
+    for reader in readers:
+        for chunksize in chunksizes:
+            for worker_count in workers:
+                table = f'bench_{reader}_{chunksize}_{worker_count}'
+                result = bench_update(url, file, table, rows, chunksize, reader, worker_count, schema, log)
+                log.info(f'{result}')
+                results.append(result)
+                sources[table] = file
+    for reader in readers:
+        results.append(bench_schema_check(url, sources, reader, schema, log))
+    if merge_table is not None:
+        merge_file = os.path.join(data_dir, f'bench_merge_{rows}x{columns}.csv')
+        # merge sources name their columns by position
+        generate_csv(merge_file, rows, columns, distribution, null_ratio, seed=seed, prefix='COL')
+        for reader in readers:
+            for chunksize in chunksizes:
+                results.append(bench_merge(url, merge_file, merge_table, rows, chunksize, reader, schema or 'dbo', log))
+    return {'started': datetime.datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'pyarrow': pyarrow.__version__ if pyarrow is not None else None,
+            'platform': platform.platform(),
+            'url': url.split('@')[-1],
+            'source': source,
+            'results': results}
+
+def _case_key(result):
+    return (result['case'], result['reader'], result['chunksize'], result['workers'])
+
+def compare(baseline, current, threshold=0.1):
+    """Compare two suite results and list cases that got slower or used more memory
+
+    Args:
+        baseline (dict): earlier run_suite result
+        current (dict): run_suite result to check
+        threshold (float, optional): relative change reported as a regression. Defaults to 0.1.
+
+    Returns:
+        list: dictionaries with case, metric, baseline, current and relative change
+    """
+    before = {_case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get(_case_key(result))
+        if old is None:
+            continue
+        # higher is better for throughput, lower is better for memory and latency
+        for metric, higher_is_better in (('rows_per_second', True), ('sources_per_second', True),
+                                         ('peak_rss_mb', False), ('batch_p95_ms', False)):
+            if not old.get(metric) or result.get(metric) is None:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append({'case': _case_key(result), 'metric': metric, 'baseline': old[metric],
+                                    'current': result[metric], 'change': round(change, 3)})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark mssql_pipeline loads against a SQLite or PostgreSQL stand-in')
+    parser.add_argument('--url', required=True, help='sqlalchemy url, e.g. sqlite:///bench.sqlite')
+    parser.add_argument('--schema', default=None, help='database schema, leave empty for SQLite')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--distribution', choices=('uniform', 'skewed', 'wide'), default='uniform')
+    parser.add_argument('--null-ratio', type=float, default=0.0)
+    parser.add_argument('--chunksizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--readers', nargs='+', default=['c', 'arrow'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--merge-table', default=None, help='SQL Server table to benchmark merge_data against')
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='result json, defaults to benchmark_<timestamp>.json')
+    parser.add_argument('--compare', default=None, help='baseline result json to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+    log = logging.getLogger('benchmark')
+    if args.readers == ['c', 'arrow'] and pyarrow is None:
+        args.readers = ['c']
+    suite = run_suite(args.url, args.rows, args.columns, tuple(args.chunksizes), tuple(args.readers), tuple(args.workers),
+                      args.distribution, args.null_ratio, args.merge_table, args.schema, args.data_dir, args.seed, log)
+    output = args.output or f"benchmark_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(suite, f, indent=1)
+    log.info(f'results written to {output}')
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, suite, args.threshold)
+        for regression in regressions:
+            log.warning(f'regression: {regression}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
 # Capture total committed Bytes in use and CPU percentage while script is running
+param([int]$IntervalMs = 500)
 
 while($true){
     $cpuUsage = Get-CimInstance -Query "SELECT * FROM Win32_PerfFormatteddata_PerfOS_Processor WHERE name = '_Total'" | Select-Object PercentProcessorTime
@@ -10,11 +11,12 @@ while($true){
         $cpu = $cpuUsage.PercentProcessorTime
     }
     if ($null -eq $memoryUsage.PercentCommittedBytesInUse) {
-        $output = 999
+        $memory = 999
     }
     else {
         $memory = $memoryUsage.PercentCommittedBytesInUse
     }
     $output = "("+ $cpu +","+ $memory + ")"
     $output
+    Start-Sleep -Milliseconds $IntervalMs
 }
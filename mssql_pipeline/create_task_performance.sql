@@ -0,0 +1,64 @@
+IF OBJECT_ID('[dbo].[task_performance]') IS NULL
+CREATE TABLE [dbo].[task_performance](
+	[process_id] [bigint] NULL,
+	[task_family] [varchar](256) NULL,
+	[task_id] [varchar](512) NULL,
+	[cpu_avg] [float] NULL,
+	[cpu_max] [float] NULL,
+	[cpu_p50] [float] NULL,
+	[cpu_p95] [float] NULL,
+	[cpu_p99] [float] NULL,
+	[mem_avg] [float] NULL,
+	[mem_max] [float] NULL,
+	[mem_p50] [float] NULL,
+	[mem_p95] [float] NULL,
+	[mem_p99] [float] NULL,
+	[total_measurements] [int] NULL,
+	[wall_seconds] [float] NULL,
+	[processing_seconds] [float] NULL,
+	[status] [varchar](16) NULL,
+	[error] [varchar](4000) NULL,
+	[hot_functions] [varchar](4000) NULL,
+	[memory_stages] [varchar](4000) NULL,
+	[ts] [datetime] NULL
+) ON [PRIMARY]
+
+-- upgrade tables created before percentiles were tracked
+IF COL_LENGTH('[dbo].[task_performance]', 'cpu_p50') IS NULL
+ALTER TABLE [dbo].[task_performance] ADD
+	[cpu_p50] [float] NULL,
+	[cpu_p95] [float] NULL,
+	[cpu_p99] [float] NULL,
+	[mem_p50] [float] NULL,
+	[mem_p95] [float] NULL,
+	[mem_p99] [float] NULL
+
+-- upgrade tables created before task outcomes were tracked
+IF COL_LENGTH('[dbo].[task_performance]', 'status') IS NULL
+ALTER TABLE [dbo].[task_performance] ADD
+	[wall_seconds] [float] NULL,
+	[processing_seconds] [float] NULL,
+	[status] [varchar](16) NULL,
+	[error] [varchar](4000) NULL
+
+-- upgrade tables created before tasks were profiled
+IF COL_LENGTH('[dbo].[task_performance]', 'hot_functions') IS NULL
+ALTER TABLE [dbo].[task_performance] ADD
+	[hot_functions] [varchar](4000) NULL
+
+-- upgrade tables created before memory stages were tracked
+IF COL_LENGTH('[dbo].[task_performance]', 'memory_stages') IS NULL
+ALTER TABLE [dbo].[task_performance] ADD
+	[memory_stages] [varchar](4000) NULL
+
+IF OBJECT_ID('[dbo].[task_performance_samples]') IS NULL
+CREATE TABLE [dbo].[task_performance_samples](
+	[task_id] [varchar](512) NULL,
+	[ts] [datetime] NULL,
+	[cpu_percent] [float] NULL,
+	[rss_mb] [float] NULL,
+	[read_mb] [float] NULL,
+	[write_mb] [float] NULL,
+	[threads] [int] NULL,
+	[processes] [int] NULL
+) ON [PRIMARY]
\ No newline at end of file
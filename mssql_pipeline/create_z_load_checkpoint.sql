@@ -0,0 +1,10 @@
+CREATE TABLE [dbo].[z_load_checkpoint](
+	[target_table] [varchar](256) NOT NULL,
+	[source_file] [varchar](1024) NOT NULL,
+	[batch] [int] NOT NULL,
+	[start_offset] [bigint] NOT NULL,
+	[end_offset] [bigint] NOT NULL,
+	[rows] [int] NOT NULL,
+	[chunksize] [int] NOT NULL,
+	[ts] [datetime] NULL
+) ON [PRIMARY]
\ No newline at end of file
@@ -1,10 +1,43 @@
 import datetime
+import queue
+import threading
+import time
 import pandas as pd
 import subprocess
 import base64
-from shapely import wkt
-import geopandas as gpd
-from sqlalchemy import create_engine, inspect
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+import bz2
+import gzip
+import lzma
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+import hashlib
+import importlib.util
+import sqlite3
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from sqlalchemy import bindparam, create_engine, inspect, text
+from sqlalchemy import types as sqltypes
+from sqlalchemy.engine.url import make_url
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# string columns are kept Arrow backed when pyarrow is installed. pyarrow itself is imported
+# by the readers and writers that use it, pyarrow.csv and pyarrow.parquet cost ~20 ms
+STRING_DTYPE = pd.StringDtype('pyarrow') if importlib.util.find_spec('pyarrow') is not None else pd.StringDtype()
+
+# pandas dtypes readers parse target dtype kinds into, see MyDatabase.target_dtypes.
+# Other kinds are parsed as text and converted afterwards.
+TYPED_DTYPES = {'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64', 'float': 'Float64', 'bool': 'boolean'}
 
 class DatabaseMergeError(Exception):
     pass
@@ -12,45 +45,1397 @@ class DatabaseMergeError(Exception):
 class ImportDBACsvError(Exception):
     pass
 
+class BulkImportError(Exception):
+    pass
+
+# process wide engines by connection url and the settings they were created with, see get_engine
+_engines = {}
+_engine_settings = {}
+_engines_lock = threading.Lock()
+# connection pool settings of get_engine, MyDatabase and the importers take overrides as engine_kwargs
+POOL_DEFAULTS = {'pool_size': 5, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 3600}
+
+def mssql_url(server, database):
+    """Build trusted connection url for My Database
+
+    Args:
+        server (str): server name
+        database (str): database name
+
+    Returns:
+        str: sqlalchemy connection url
+    """
+    return 'mssql+pyodbc://' + server + '/' + database + '?trusted_connection=yes&driver=SQL+Server&TrustServerCertificate=yes&Encrypt=yes'
+
+def get_engine(url, pool_size=None, max_overflow=None, pool_pre_ping=None, pool_recycle=None, **kwargs):
+    """Get the process wide engine for url, creating it on first use. Every MyDatabase,
+    PerformanceTracker and importer on the same url shares one connection pool. Pool
+    settings only apply when the engine is created, a later call asking for other
+    settings gets the existing engine and a warning.
+
+    Args:
+        url (str): sqlalchemy connection url
+        pool_size (int, optional): connections kept open. Defaults to 5.
+        max_overflow (int, optional): extra connections allowed under load. Defaults to 10.
+        pool_pre_ping (bool, optional): test connections before use. Defaults to True.
+        pool_recycle (int, optional): seconds before a connection is replaced. Defaults to 3600.
+        **kwargs: other create_engine parameters
+
+    Returns:
+        sqlalchemy.engine.Engine: shared engine
+    """
+    requested = {k: v for k, v in {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_pre_ping': pool_pre_ping,
+                                   'pool_recycle': pool_recycle}.items() if v is not None}
+    requested.update(kwargs)
+    with _engines_lock:
+        if url not in _engines:
+            settings = {**POOL_DEFAULTS, **requested}
+            if url.startswith('mssql+pyodbc'):
+                settings.setdefault('fast_executemany', True)
+            if url.startswith('sqlite'):
+                # sqlite uses its own single connection pools
+                settings = {k: v for k, v in settings.items() if k not in POOL_DEFAULTS}
+            _engines[url] = create_engine(url, **settings)
+            _engine_settings[url] = settings
+        else:
+            created = _engine_settings[url]
+            differ = {k: v for k, v in requested.items()
+                      if (k in created and created[k] != v) or (k not in created and k not in POOL_DEFAULTS)}
+            if differ:
+                logging.getLogger(__name__).warning(f'engine for {make_url(url)!r} already exists, ignoring {differ}, '
+                                                    f'it was created with {created}')
+        return _engines[url]
+
+def pool_status():
+    """Connection pool statistics for every shared engine
+
+    Returns:
+        dict: url, password hidden, and dict with size, checked_in, checked_out and overflow
+    """
+    status = {}
+    with _engines_lock:
+        for engine in _engines.values():
+            pool = engine.pool
+            status[repr(engine.url)] = {'size': getattr(pool, 'size', lambda: None)(),
+                                        'checked_in': getattr(pool, 'checkedin', lambda: None)(),
+                                        'checked_out': getattr(pool, 'checkedout', lambda: None)(),
+                                        'overflow': getattr(pool, 'overflow', lambda: None)()}
+    return status
+
+def dispose_engines():
+    """Close pooled connections of every shared engine and forget the engines"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _engine_settings.clear()
+
+# leading bytes of supported compressed files
+MAGIC_BYTES = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2', b'\xfd7zXZ\x00': 'xz', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+def detect_compression(file):
+    """Detect compression of file from its magic bytes
+
+    Args:
+        file (str): file to check
+
+    Returns:
+        str: 'gzip', 'bz2', 'xz', 'zstd' or None for uncompressed files
+    """
+    with open(file, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+class ThreadedDecompressor(io.RawIOBase):
+    """Read only stream that decompresses on a background thread into a bounded queue
+    of blocks, so decompression overlaps with parsing and inserting. Use through
+    open_source, which wraps it in io.BufferedReader.
+    """
+    def __init__(self, stream, block_size=1 << 20, max_blocks=8):
+        """Constructor for class
+
+        Args:
+            stream (io.BufferedIOBase): decompressing stream
+            block_size (int, optional): decompressed bytes per block. Defaults to 1 MiB.
+            max_blocks (int, optional): decompressed blocks held ahead of the reader. Defaults to 8.
+        """
+        super().__init__()
+        self._stream = stream
+        self._block_size = block_size
+        self._queue = queue.Queue(maxsize=max_blocks)
+        self._stop = threading.Event()
+        self._error = None
+        self._block = memoryview(b'')
+        self._eof = False
+        self._position = 0
+        self._thread = threading.Thread(target=self._fill, name='decompress', daemon=True)
+        self._thread.start()
+
+    def _put(self, block):
+        # stop waiting on a full queue once the reader is closed
+        while not self._stop.is_set():
+            try:
+                self._queue.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._stream.read(self._block_size)
+                if not block:
+                    break
+                self._put(block)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if len(self._block) == 0:
+            if self._eof:
+                return 0
+            block = self._queue.get()
+            if block is None:
+                self._eof = True
+                if self._error is not None:
+                    raise self._error
+                return 0
+            self._block = memoryview(block)
+        n = min(len(b), len(self._block))
+        b[:n] = self._block[:n]
+        self._block = self._block[n:]
+        self._position = self._position + n
+        return n
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+def open_source(file):
+    """Open file for binary reading, compressed files are detected from their magic bytes
+    and decompressed on a background thread
+
+    Args:
+        file (str): file to open
+
+    Raises:
+        ValueError: zstd file and zstandard package not installed
+
+    Returns:
+        io.BufferedReader: binary stream of uncompressed content
+    """
+    compression = detect_compression(file)
+    if compression is None:
+        return open(file, 'rb')
+    if compression == 'gzip':
+        stream = gzip.open(file, 'rb')
+    elif compression == 'bz2':
+        stream = bz2.open(file, 'rb')
+    elif compression == 'xz':
+        stream = lzma.open(file, 'rb')
+    elif zstandard is None:
+        raise ValueError(f'{file} is zstd compressed, install zstandard to read it')
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'), closefd=True)
+    return io.BufferedReader(ThreadedDecompressor(stream))
+
+def seek_forward(fh, offset):
+    """Move binary stream to offset of uncompressed content. Streams that cannot seek are
+    read forward and the bytes discarded.
+
+    Args:
+        fh (io.BufferedReader): binary stream from open_source
+        offset (int): target offset
+    """
+    if fh.seekable():
+        fh.seek(offset)
+        return
+    while fh.tell() < offset:
+        if not fh.read(min(1 << 20, offset - fh.tell())):
+            break
+
+class CsvReader(ABC):
+    """Base class for csv readers used by MyDatabase loads. Readers take the same
+    file_kwargs as pandas.read_csv and stream a file as DataFrame chunks. Subclasses
+    implement chunks, frame and parse.
+    """
+    def __init__(self, file_kwargs):
+        """Constructor for class
+
+        Args:
+            file_kwargs (dict): parameters to interact with read_csv
+        """
+        self.file_kwargs = dict(file_kwargs)
+
+    @staticmethod
+    @contextmanager
+    def _source(file):
+        """Private context manager giving the path of uncompressed files, which parsers read
+        natively, or a decompressing stream for compressed files
+
+        Args:
+            file (str): name of csv file
+
+        Yields:
+            str or io.BufferedReader: path or binary stream
+        """
+        if detect_compression(file) is None:
+            yield file
+            return
+        with open_source(file) as fh:
+            yield fh
+
+    def header(self, file):
+        """Read column names from the first record of file without parsing any rows
+
+        Args:
+            file (str): name of csv file
+
+        Returns:
+            list: column names
+        """
+        return self._header(file)
+
+    def _header(self, file):
+        """Private method to read column names from the first record of file
+
+        Args:
+            file (str): name of csv file
+
+        Returns:
+            list: column names
+        """
+        with open_source(file) as fh:
+            return self._header_from(io.TextIOWrapper(fh, encoding=self.file_kwargs.get('encoding', 'utf-8-sig'), newline=''))
+
+    def _header_from(self, lines):
+        """Private method to read column names from the first record of text lines
+
+        Args:
+            lines (iterable): text lines
+
+        Returns:
+            list: column names
+        """
+        return next(csv.reader(lines, delimiter=self._sep(), quotechar=self.file_kwargs.get('quotechar', '"')))
+
+    def _sep(self):
+        return self.file_kwargs.get('sep', self.file_kwargs.get('delimiter', ','))
+
+    @abstractmethod
+    def chunks(self, file, rows=None):
+        """Stream file as DataFrame chunks of file_kwargs['chunksize'] rows
+
+        Args:
+            file (str): name of csv file
+            rows (callable, optional): called before every chunk for its row count, overrides
+                file_kwargs['chunksize']. Defaults to None.
+
+        Yields:
+            pandas.DataFrame: chunk of file
+        """
+
+    @abstractmethod
+    def frame(self, file):
+        """Read file, or the first file_kwargs['nrows'] rows, into one DataFrame
+
+        Args:
+            file (str): name of csv file
+
+        Returns:
+            pandas.DataFrame: file contents
+        """
+
+    @abstractmethod
+    def parse(self, buffer, dtypes=None):
+        """Parse raw csv bytes, header record first, into one DataFrame
+
+        Args:
+            buffer (bytes): header record followed by whole data records
+            dtypes (dict, optional): column name and dtype kind from MyDatabase.target_dtypes. Columns of kinds in
+                TYPED_DTYPES are parsed into that dtype or a wider integer dtype, and a value that does not convert
+                raises ValueError or TypeError. Defaults to None, columns are parsed as text.
+
+        Returns:
+            pandas.DataFrame: parsed records
+        """
+
+class PandasCsvReader(CsvReader):
+    """Reader using pandas.read_csv with the C engine, or the python engine for
+    dialects only it supports (regex or sniffed separators, skipfooter)
+    """
+    def __init__(self, file_kwargs, engine='c'):
+        """Constructor for class
+
+        Args:
+            file_kwargs (dict): parameters to interact with read_csv
+            engine (str, optional): pandas parser engine. Defaults to 'c'.
+        """
+        super().__init__(file_kwargs)
+        self.file_kwargs['engine'] = engine
+
+    def header(self, file):
+        sep = self._sep()
+        if sep is not None and len(sep) == 1:
+            return self._header(file)
+        # regex or sniffed separators need the python engine
+        kwargs = dict(self.file_kwargs)
+        kwargs.pop('chunksize', None)
+        kwargs['nrows'] = 0
+        with self._source(file) as source:
+            return pd.read_csv(source, **kwargs).columns.tolist()
+
+    def chunks(self, file, rows=None):
+        kwargs = dict(self.file_kwargs)
+        chunksize = kwargs.pop('chunksize', 10000)
+        if rows is None:
+            rows = lambda: chunksize
+        with self._source(file) as source:
+            with pd.read_csv(source, iterator=True, **kwargs) as parsed:
+                while True:
+                    try:
+                        chunk = parsed.get_chunk(rows())
+                    except StopIteration:
+                        break
+                    yield chunk
+
+    def frame(self, file):
+        kwargs = dict(self.file_kwargs)
+        kwargs.pop('chunksize', None)
+        with self._source(file) as source:
+            return pd.read_csv(source, **kwargs)
+
+    def parse(self, buffer, dtypes=None):
+        kwargs = dict(self.file_kwargs)
+        kwargs.pop('chunksize', None)
+        kwargs.pop('nrows', None)
+        if dtypes:
+            text = kwargs.get('dtype', str)
+            # the C parser wraps values that overflow a narrow integer dtype, so integers are parsed
+            # as Int64 and range checked by MyDatabase._convert_column
+            typed = {c: 'Int64' if k in ('int16', 'int32') else TYPED_DTYPES.get(k, STRING_DTYPE)
+                     for c, k in dtypes.items() if k != 'datetime'}
+            kwargs['dtype'] = defaultdict(lambda: text, typed)
+        return pd.read_csv(io.BytesIO(buffer), **kwargs)
+
+class ArrowCsvReader(CsvReader):
+    """Reader using the pyarrow streaming csv parser. Only block_size bytes of the
+    file are parsed at a time, and string columns are kept as Arrow backed strings
+    instead of python objects.
+    """
+    # read_csv parameters the Arrow reader can translate
+    supported_kwargs = {'sep', 'delimiter', 'encoding', 'quotechar', 'dtype', 'chunksize', 'nrows', 'usecols', 'header', 'engine'}
+
+    def __init__(self, file_kwargs, block_size=1 << 24):
+        """Constructor for class
+
+        Args:
+            file_kwargs (dict): parameters to interact with read_csv
+            block_size (int, optional): bytes parsed per record batch, the memory budget of the reader. Defaults to 16 MiB.
+        """
+        super().__init__(file_kwargs)
+        self.block_size = block_size
+
+    @classmethod
+    def supports(cls, file_kwargs):
+        """Check if file_kwargs can be translated to Arrow options
+
+        Args:
+            file_kwargs (dict): parameters to interact with read_csv
+
+        Returns:
+            bool: True if pyarrow is installed and every parameter is supported
+        """
+        if importlib.util.find_spec('pyarrow') is None:
+            return False
+        if not set(file_kwargs).issubset(cls.supported_kwargs):
+            return False
+        if file_kwargs.get('header', 'infer') not in ('infer', 0):
+            return False
+        if not all(isinstance(c, str) for c in file_kwargs.get('usecols') or []):
+            return False
+        return file_kwargs.get('dtype', str) in (str, 'str', 'string', object)
+
+    def _open(self, file, source):
+        """Private method to open a streaming Arrow reader
+
+        Args:
+            file (str): name of csv file
+            source (str or io.BufferedReader): path or binary stream of file
+
+        Returns:
+            pyarrow.csv.CSVStreamingReader: record batch reader
+        """
+        import pyarrow.csv as pacsv
+        return pacsv.open_csv(source, **self._options(self._header(file)))
+
+    def _options(self, columns, dtypes=None):
+        """Private method to translate file_kwargs to Arrow csv options
+
+        Args:
+            columns (list): column names from the header record
+            dtypes (dict, optional): column name and dtype kind, see CsvReader.parse. Defaults to None.
+
+        Returns:
+            dict: read_options, parse_options and convert_options
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        types = {'int16': pa.int16(), 'int32': pa.int32(), 'int64': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_()}
+        dtypes = dtypes or {}
+        read_options = pacsv.ReadOptions(block_size=self.block_size,
+                                         encoding=self.file_kwargs.get('encoding', 'utf8'))
+        parse_options = pacsv.ParseOptions(delimiter=self._sep(),
+                                           quote_char=self.file_kwargs.get('quotechar', '"'))
+        convert_options = pacsv.ConvertOptions(column_types={c: types.get(dtypes.get(c), pa.string()) for c in columns},
+                                               include_columns=self.file_kwargs.get('usecols'),
+                                               strings_can_be_null=True)
+        return {'read_options': read_options, 'parse_options': parse_options, 'convert_options': convert_options}
+
+    @staticmethod
+    def _to_pandas(table):
+        """Private method to convert Arrow table to DataFrame with Arrow backed strings and
+        nullable numbers
+
+        Args:
+            table (pyarrow.Table): parsed rows
+
+        Returns:
+            pandas.DataFrame: converted rows
+        """
+        import pyarrow as pa
+        types = {pa.string(): STRING_DTYPE, pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+                 pa.float64(): pd.Float64Dtype(), pa.bool_(): pd.BooleanDtype()}
+        return table.to_pandas(types_mapper=types.get)
+
+    def _batches(self, file, rows):
+        """Private generator to regroup Arrow record batches into tables of rows
+
+        Args:
+            file (str): name of csv file
+            rows (int or callable): rows per table, or called before every table for its row count
+
+        Yields:
+            pyarrow.Table: table of rows, the last one may be shorter
+        """
+        import pyarrow as pa
+        size = rows if callable(rows) else lambda: rows
+        pending = []
+        pending_rows = 0
+        wanted = size()
+        with self._source(file) as source:
+            for record_batch in self._open(file, source):
+                pending.append(record_batch)
+                pending_rows = pending_rows + record_batch.num_rows
+                while pending_rows >= wanted:
+                    table = pa.Table.from_batches(pending)
+                    yield table.slice(0, wanted)
+                    rest = table.slice(wanted)
+                    pending = rest.to_batches()
+                    pending_rows = rest.num_rows
+                    wanted = size()
+        if pending_rows > 0:
+            yield pa.Table.from_batches(pending)
+
+    def chunks(self, file, rows=None):
+        # stop after nrows rows like read_csv
+        remaining = self.file_kwargs.get('nrows')
+        for table in self._batches(file, rows or self.file_kwargs.get('chunksize', 10000)):
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                table = table.slice(0, remaining)
+                remaining = remaining - table.num_rows
+            yield self._to_pandas(table)
+
+    def frame(self, file):
+        nrows = self.file_kwargs.get('nrows')
+        if nrows is None:
+            with self._source(file) as source:
+                return self._to_pandas(self._open(file, source).read_all())
+        for table in self._batches(file, nrows):
+            return self._to_pandas(table)
+        return pd.DataFrame(columns=self._header(file))
+
+    def parse(self, buffer, dtypes=None):
+        lines = io.TextIOWrapper(io.BytesIO(buffer), encoding=self.file_kwargs.get('encoding', 'utf-8-sig'), newline='')
+        columns = self._header_from(lines)
+        import pyarrow.csv as pacsv
+        return self._to_pandas(pacsv.read_csv(io.BytesIO(buffer), **self._options(columns, dtypes)))
+
+def read_record(fh, quotechar=b'"'):
+    """Read one csv record from binary file handle. Newlines inside quoted
+    values do not end the record.
+
+    Args:
+        fh (io.BufferedReader): binary file handle
+        quotechar (bytes, optional): quote character. Defaults to b'"'.
+
+    Returns:
+        bytes: record including line terminator, empty at end of file
+    """
+    record = fh.readline()
+    quotes = record.count(quotechar)
+    while quotes % 2 == 1:
+        line = fh.readline()
+        if not line:
+            break
+        record = record + line
+        quotes = quotes + line.count(quotechar)
+    return record
+
+def iter_record_blocks(fh, rows, quotechar=b'"'):
+    """Read binary file handle as blocks of whole csv records
+
+    Args:
+        fh (io.BufferedReader): binary file handle positioned at the start of a record
+        rows (int or callable): records per block, or called before every block for its record count
+        quotechar (bytes, optional): quote character. Defaults to b'"'.
+
+    Yields:
+        tuple: block bytes, start byte offset and end byte offset
+    """
+    size = rows if callable(rows) else lambda: rows
+    start = fh.tell()
+    while True:
+        records = []
+        for _ in range(size()):
+            record = read_record(fh, quotechar)
+            if not record:
+                break
+            records.append(record)
+        if not records:
+            return
+        end = fh.tell()
+        yield b''.join(records), start, end
+        start = end
+
+def iter_byte_ranges(fh, range_bytes, quotechar=b'"', block_size=1 << 24):
+    """Split binary file handle into byte ranges of about range_bytes that start and end on
+    record boundaries. Quote parity is tracked from the start of the data, so newlines inside
+    quoted values never end a range. The file must use an ASCII compatible encoding.
+
+    Args:
+        fh (io.BufferedReader): seekable binary file handle positioned at the start of a record
+        range_bytes (int): target bytes per range
+        quotechar (bytes, optional): quote character. Defaults to b'"'.
+        block_size (int, optional): bytes scanned at a time. Defaults to 16 MiB.
+
+    Yields:
+        tuple: start and end byte offset of a range of whole records
+    """
+    start = fh.tell()
+    base = start
+    block = fh.read(block_size)
+    pos = 0
+    in_quotes = False
+    while block:
+        target = start + range_bytes
+        boundary = None
+        while block:
+            end = base + len(block)
+            if target >= end:
+                in_quotes = in_quotes != (block.count(quotechar, pos) % 2 == 1)
+                base = end
+                block = fh.read(block_size)
+                pos = 0
+                continue
+            if base + pos < target:
+                in_quotes = in_quotes != (block.count(quotechar, pos, target - base) % 2 == 1)
+                pos = target - base
+            newline = block.find(b'\n', pos)
+            if newline == -1:
+                in_quotes = in_quotes != (block.count(quotechar, pos) % 2 == 1)
+                base = end
+                block = fh.read(block_size)
+                pos = 0
+                continue
+            in_quotes = in_quotes != (block.count(quotechar, pos, newline) % 2 == 1)
+            pos = newline + 1
+            if not in_quotes:
+                boundary = base + pos
+                break
+        if boundary is None:
+            # rest of file is the last range
+            boundary = base
+        if boundary > start:
+            yield start, boundary
+        start = boundary
+
+def parse_typed(parser, buffer, dtypes=None):
+    """Parse raw csv bytes into dtypes, or as text when a value does not convert so the
+    failing rows can be rejected row by row
+
+    Args:
+        parser (CsvReader): reader used to parse buffer
+        buffer (bytes): header record followed by whole data records
+        dtypes (dict, optional): column name and dtype kind, see CsvReader.parse. Defaults to None.
+
+    Returns:
+        pandas.DataFrame: parsed records
+    """
+    if dtypes:
+        try:
+            return parser.parse(buffer, dtypes)
+        except (ValueError, TypeError, OverflowError):
+            pass
+    return parser.parse(buffer)
+
+def _parse_byte_range(file, header, start, end, file_kwargs, reader, dtypes=None):
+    """Private worker to parse one byte range of file in a separate process
+
+    Args:
+        file (str): name of csv file
+        header (bytes): header record
+        start (int): start byte offset
+        end (int): end byte offset
+        file_kwargs (dict): parameters to interact with read_csv
+        reader (str or CsvReader): csv reader, see make_reader
+        dtypes (dict, optional): column name and dtype kind, see parse_typed. Defaults to None.
+
+    Returns:
+        pandas.DataFrame: parsed records
+    """
+    with open(file, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    return parse_typed(make_reader(file_kwargs, reader), header + data, dtypes)
+
+class FileCheckpoint:
+    """Sidecar json file with the committed batches of a load. Batches are saved
+    after their transaction commits. Entries are kept per table and absolute source
+    path with the size and mtime of the source, so one explicit path can hold several
+    loads and a rewritten source is loaded from its start.
+    """
+    # saved after the batch commits, a batch is never recorded without its rows
+    transactional = False
+
+    def __init__(self, path=None):
+        """Constructor for class
+
+        Args:
+            path (str, optional): checkpoint file. Defaults to the source file + '.checkpoint.json'.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _path(self, file):
+        return self.path or file + '.checkpoint.json'
+
+    def _read(self, file):
+        """Private method to read the checkpoint file
+
+        Args:
+            file (str): name of csv file
+
+        Returns:
+            dict: absolute source path, table and entry with size, mtime and batches
+        """
+        if not os.path.exists(self._path(file)):
+            return {}
+        with open(self._path(file), 'r') as f:
+            return json.load(f)
+
+    def _write(self, file, data):
+        """Private method to replace the checkpoint file, or remove it when data is empty
+
+        Args:
+            file (str): name of csv file
+            data (dict): checkpoint entries, see _read
+        """
+        path = self._path(file)
+        if not data:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        # write then rename so a crash never leaves a partial checkpoint, every writer gets its own tmp file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _source(file):
+        """Private method to identify the current version of a source file
+
+        Args:
+            file (str): name of csv file
+
+        Returns:
+            dict: size and mtime of file
+        """
+        stat = os.stat(file)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self, table, file):
+        """Load committed batches for table and file, batches of an earlier version of file are ignored
+
+        Args:
+            table (str): name of table
+            file (str): name of csv file
+
+        Returns:
+            dict: batch number and dict with start, end, rows and chunksize
+        """
+        entry = self._read(file).get(os.path.abspath(file), {}).get(table)
+        if entry is None or {'size': entry['size'], 'mtime': entry['mtime']} != self._source(file):
+            return {}
+        return {int(k): v for k, v in entry['batches'].items()}
+
+    def save(self, table, file, batch, start, end, rows, chunksize, con=None):
+        """Record committed batch
+
+        Args:
+            table (str): name of table
+            file (str): name of csv file
+            batch (int): batch number
+            start (int): byte offset of first record
+            end (int): byte offset after last record
+            rows (int): rows in batch
+            chunksize (int): records per batch
+            con (sqlalchemy.engine.Connection, optional): unused, sidecar files are written after commit. Defaults to None.
+        """
+        with self._lock:
+            data = self._read(file)
+            source = self._source(file)
+            entries = data.setdefault(os.path.abspath(file), {})
+            entry = entries.get(table)
+            if entry is None or {'size': entry['size'], 'mtime': entry['mtime']} != source:
+                # batches of an earlier version of file are dropped
+                entry = entries[table] = {**source, 'batches': {}}
+            entry['batches'][str(batch)] = {'start': start, 'end': end, 'rows': rows, 'chunksize': chunksize}
+            self._write(file, data)
+
+    def clear(self, table, file):
+        """Remove checkpoint of table and file once load finished, the checkpoint file is removed when it is empty
+
+        Args:
+            table (str): name of table
+            file (str): name of csv file
+        """
+        with self._lock:
+            data = self._read(file)
+            entries = data.get(os.path.abspath(file), {})
+            entries.pop(table, None)
+            if not entries:
+                data.pop(os.path.abspath(file), None)
+            self._write(file, data)
+
+class TableCheckpoint:
+    """Checkpoint table in the target database. Batches are recorded in the same
+    transaction that inserts them, see create_z_load_checkpoint.sql.
+    """
+    # saved on the connection inserting the batch, before it commits
+    transactional = True
+
+    def __init__(self, database, table='z_load_checkpoint'):
+        """Constructor for class
+
+        Args:
+            database (MyDatabase): database holding the checkpoint table
+            table (str, optional): checkpoint table name. Defaults to 'z_load_checkpoint'.
+        """
+        self.database = database
+        self.table = table
+
+    def load(self, table, file):
+        """Load committed batches for table and file, see FileCheckpoint.load"""
+        if not inspect(self.database.engine).has_table(self.table, schema=self.database.schema):
+            return {}
+        query = text(f'select batch, start_offset, end_offset, rows, chunksize from [{self.database.schema}].[{self.table}] '
+                     'where target_table = :table and source_file = :file')
+        df = pd.read_sql(query, self.database.engine, params={'table': table, 'file': file})
+        return {int(r.batch): {'start': int(r.start_offset), 'end': int(r.end_offset), 'rows': int(r.rows), 'chunksize': int(r.chunksize)}
+                for r in df.itertuples()}
+
+    def save(self, table, file, batch, start, end, rows, chunksize, con=None):
+        """Record committed batch on con, the connection inserting it, see FileCheckpoint.save"""
+        df = pd.DataFrame([{'target_table': table, 'source_file': file, 'batch': batch, 'start_offset': start,
+                            'end_offset': end, 'rows': rows, 'chunksize': chunksize, 'ts': datetime.datetime.now()}])
+        df.to_sql(name=self.table, con=con or self.database.engine, schema=self.database.schema, if_exists='append', index=False)
+
+    def clear(self, table, file):
+        """Remove checkpoint rows once load finished"""
+        query = text(f'delete from [{self.database.schema}].[{self.table}] where target_table = :table and source_file = :file')
+        with self.database.engine.begin() as con:
+            con.execute(query, {'table': table, 'file': file})
+
+class MergePlan:
+    """MERGE statement for one target table, built from INFORMATION_SCHEMA.COLUMNS
+    and z_merge_columns the same way usp_dynamic_merge builds it. Staging columns
+    COL1, COL2 ... map to target columns by ordinal position, skipping the row hash column.
+    """
+    # types rendered with a length
+    sized_types = {'varchar', 'nvarchar', 'char', 'nchar', 'varbinary', 'binary'}
+
+    def __init__(self, target, schema, columns, keys, version, typed_source=False, row_hash_column=None):
+        """Constructor for class
+
+        Args:
+            target (str): name of target table
+            schema (str): schema of target table
+            columns (list): INFORMATION_SCHEMA.COLUMNS rows as dictionaries in ordinal order
+            keys (list): (source_col, target_col) pairs from z_merge_columns
+            version (tuple): target modify date and z_merge_columns checksum the plan was built from
+            typed_source (bool, optional): staging columns already have target types, skip CASTs. Defaults to False.
+            row_hash_column (str, optional): bigint column holding the row hash in target and staging. Matched rows
+                are only updated when the hashes differ. Defaults to None.
+        """
+        self.target = target
+        self.schema = schema
+        self.columns = [c for c in columns if c['COLUMN_NAME'] != row_hash_column]
+        self.keys = keys
+        self.version = version
+        self.typed_source = typed_source
+        self.row_hash_column = row_hash_column
+        # staging column number by target column name
+        self.positions = {c['COLUMN_NAME']: i + 1 for i, c in enumerate(self.columns)}
+
+    @classmethod
+    def sql_type(cls, column):
+        """Render column type for CAST
+
+        Args:
+            column (dict): INFORMATION_SCHEMA.COLUMNS row
+
+        Returns:
+            str: T-SQL type
+        """
+        data_type = column['DATA_TYPE']
+        if data_type in cls.sized_types:
+            length = column['CHARACTER_MAXIMUM_LENGTH']
+            return f"{data_type}({'MAX' if length == -1 else str(int(length))})"
+        if data_type in ('decimal', 'numeric'):
+            return f"{data_type}({str(int(column['NUMERIC_PRECISION']))},{str(int(column['NUMERIC_SCALE']))})"
+        return data_type
+
+    def source_value(self, column):
+        """Render staging value for target column
+
+        Args:
+            column (dict): INFORMATION_SCHEMA.COLUMNS row
+
+        Returns:
+            str: T-SQL expression
+        """
+        source_col = f"Source.[COL{str(self.positions[column['COLUMN_NAME']])}]"
+        if self.typed_source:
+            return source_col
+        return f'CAST({source_col} AS {self.sql_type(column)})'
+
+    def source_key(self, source_col, target_col):
+        """Render staging key expression in the type of the target key column
+
+        Args:
+            source_col (str): staging column
+            target_col (str): target column
+
+        Returns:
+            str: T-SQL expression
+        """
+        column = next(c for c in self.columns if c['COLUMN_NAME'] == target_col)
+        if self.typed_source:
+            return f'Source.[{source_col}]'
+        return f'CAST(Source.[{source_col}] AS {self.sql_type(column)})'
+
+    def sql(self, source, where=None):
+        """Build MERGE batch. The batch returns one row with the staging rows read and
+        the rows inserted and updated.
+
+        Args:
+            source (str): qualified staging table
+            where (str, optional): filter on staging rows, using the Source alias. Defaults to None.
+
+        Returns:
+            str: T-SQL batch
+        """
+        using = source if where is None else f'(select * from {source} as Source where {where})'
+        on = ' AND '.join(f'{self.source_key(s, t)} = Target.[{t}]' for s, t in self.keys)
+        names = [f"[{c['COLUMN_NAME']}]" for c in self.columns]
+        values = [self.source_value(c) for c in self.columns]
+        updates = [f"Target.[{c['COLUMN_NAME']}] = {self.source_value(c)}" for c in self.columns]
+        matched = 'WHEN MATCHED'
+        if self.row_hash_column is not None:
+            hash_col = f'[{self.row_hash_column}]'
+            names.append(hash_col)
+            values.append(f'Source.{hash_col}')
+            updates.append(f'Target.{hash_col} = Source.{hash_col}')
+            # unchanged rows keep their hash and are not touched
+            matched = f'WHEN MATCHED AND (Target.{hash_col} IS NULL OR Target.{hash_col} <> Source.{hash_col})'
+        names = ',\n\t\t'.join(names)
+        values = ',\n\t\t'.join(values)
+        updates = ',\n\t'.join(updates)
+        return (f'SET NOCOUNT ON;\n'
+                f'DECLARE @actions TABLE (action nvarchar(10));\n'
+                f'DECLARE @source_rows int = (select count(*) from {using} AS Source);\n'
+                f'MERGE [{self.schema}].[{self.target}] AS Target\n'
+                f'USING {using} AS Source\n'
+                f'ON {on}\n'
+                f'WHEN NOT MATCHED BY Target THEN\n'
+                f'\tINSERT (\n\t\t{names}\n\t)\n'
+                f'\tVALUES (\n\t\t{values}\n\t)\n'
+                f'{matched} THEN UPDATE SET\n\t{updates}\n'
+                f'OUTPUT $action INTO @actions;\n'
+                f"select @source_rows as source_rows, "
+                f"sum(case when action = 'INSERT' then 1 else 0 end) as inserted, "
+                f"sum(case when action = 'UPDATE' then 1 else 0 end) as updated from @actions;")
+
+class LoadManifest:
+    """SQLite manifest of the files loaded into each table, with size, mtime and sha256 of
+    the file content. Loads of a file that did not change since it was last loaded into
+    the same table of the same database are skipped. Every entry is written in its own
+    transaction, so loads in parallel threads or processes can share one manifest.
+
+    Example:
+
+    manifest = LoadManifest('C:\\Example_Data\\load_manifest.sqlite')
+    destination_database = MyDatabase(server, database, log, manifest=manifest)
+    """
+    def __init__(self, path):
+        """Constructor for class
+
+        Args:
+            path (str): manifest file
+        """
+        self.path = path
+        con = self._connect()
+        try:
+            con.execute('pragma journal_mode=wal')
+            con.execute('create table if not exists manifest (key text primary key, size integer not null, '
+                        'mtime real not null, sha256 text not null, loaded text not null)')
+            con.commit()
+        finally:
+            con.close()
+
+    def _connect(self):
+        """Private method to open a manifest connection, one per call so threads and processes never share one
+
+        Returns:
+            sqlite3.Connection: manifest connection
+        """
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def fingerprint(file, block_size=1 << 20):
+        """Fingerprint file, the content hash is read block by block
+
+        Args:
+            file (str): file to fingerprint
+            block_size (int, optional): bytes hashed at a time. Defaults to 1 MiB.
+
+        Returns:
+            dict: size, mtime and sha256 of file
+        """
+        stat = os.stat(file)
+        digest = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+
+    @staticmethod
+    def _key(file, table, target=None):
+        return (target or '') + '|' + table + '|' + os.path.abspath(file)
+
+    def _entry(self, key):
+        """Private method to read the manifest entry of key
+
+        Args:
+            key (str): entry key from _key
+
+        Returns:
+            dict: size, mtime and sha256, None if the file was never loaded
+        """
+        con = self._connect()
+        try:
+            row = con.execute('select size, mtime, sha256 from manifest where key = ?', (key,)).fetchone()
+        finally:
+            con.close()
+        if row is None:
+            return None
+        return {'size': row[0], 'mtime': row[1], 'sha256': row[2]}
+
+    def check(self, file, table, force=False, target=None):
+        """Check if file is unchanged since it was last loaded into table. The hash is
+        only computed when size matches and mtime does not.
+
+        Args:
+            file (str): source file
+            table (str): target table
+            force (bool, optional): always report the file as changed. Defaults to False.
+            target (str, optional): database and schema of table, see target_identity. Defaults to None.
+
+        Returns:
+            tuple: True if unchanged, fingerprint to record after loading or None if unchanged
+        """
+        entry = self._entry(self._key(file, table, target))
+        stat = os.stat(file)
+        if not force and entry is not None and entry['size'] == stat.st_size:
+            if entry['mtime'] == stat.st_mtime:
+                return True, None
+            fingerprint = self.fingerprint(file)
+            if fingerprint['sha256'] == entry['sha256']:
+                # same content with a new mtime, remember mtime to skip hashing next time
+                self.record(file, table, fingerprint, target)
+                return True, None
+            return False, fingerprint
+        return False, self.fingerprint(file)
+
+    def record(self, file, table, fingerprint=None, target=None):
+        """Record file as loaded into table
+
+        Args:
+            file (str): source file
+            table (str): target table
+            fingerprint (dict, optional): fingerprint taken before loading. Defaults to fingerprint of file now.
+            target (str, optional): database and schema of table, see target_identity. Defaults to None.
+        """
+        fingerprint = fingerprint or self.fingerprint(file)
+        con = self._connect()
+        try:
+            with con:
+                con.execute('insert or replace into manifest (key, size, mtime, sha256, loaded) values (?, ?, ?, ?, ?)',
+                            (self._key(file, table, target), fingerprint['size'], fingerprint['mtime'], fingerprint['sha256'],
+                             datetime.datetime.now().isoformat()))
+        finally:
+            con.close()
+
+def target_identity(url, schema=None):
+    """Identify the database and schema of a load for LoadManifest, without credentials
+
+    Args:
+        url (str or sqlalchemy.engine.URL): connection url
+        schema (str, optional): database schema. Defaults to None.
+
+    Returns:
+        str: host, port, database and schema
+    """
+    url = make_url(url)
+    host = (url.host or '') + (':' + str(url.port) if url.port else '')
+    return host + '/' + (url.database or '') + '/' + (schema or '')
+
+def check_manifest(manifest, file, table, force, log, target=None):
+    """Check manifest for a file unchanged since its last load into table
+
+    Args:
+        manifest (LoadManifest): manifest or None
+        file (str): source file
+        table (str): target table
+        force (bool): load even if unchanged
+        log (logging): ETL log
+        target (str, optional): database and schema of table, see target_identity. Defaults to None.
+
+    Returns:
+        tuple: True if load can be skipped, fingerprint to record after loading
+    """
+    if manifest is None:
+        return False, None
+    unchanged, fingerprint = manifest.check(file, table, force, target)
+    if unchanged:
+        log.info(f'{file} unchanged since last load to {table}, skipping')
+    return unchanged, fingerprint
+
+class ChunkTuner:
+    """Adaptive chunk size for update_database. Every written batch is measured for rows per
+    second and the memory of the parsed chunk, and the next chunks are sized toward
+    target_seconds of write time per batch without exceeding memory_limit bytes per chunk.
+    The chunk size settles once settle_batches batches in a row change it by less than
+    tolerance, and the settled value is logged per table so it can be pinned in file_kwargs.
+
+    Example:
+
+    tuner = ChunkTuner(target_seconds=2.0, memory_limit=256 * 1024 ** 2)
+    destination_database.update_database(table, file, autotune=tuner)
+    """
+    def __init__(self, target_seconds=2.0, memory_limit=None, initial=10000, min_rows=1000, max_rows=1000000,
+                 max_step=2.0, tolerance=0.1, settle_batches=3):
+        """Constructor for class
+
+        Args:
+            target_seconds (float, optional): target write time per batch. Defaults to 2.0.
+            memory_limit (int, optional): max bytes of one parsed chunk. Defaults to None.
+            initial (int, optional): rows in the first chunk. Defaults to 10000.
+            min_rows (int, optional): smallest chunk size. Defaults to 1000.
+            max_rows (int, optional): largest chunk size. Defaults to 1000000.
+            max_step (float, optional): max factor the chunk size grows or shrinks by after one batch. Defaults to 2.0.
+            tolerance (float, optional): relative change still counted as settled. Defaults to 0.1.
+            settle_batches (int, optional): batches in a row within tolerance before the size is settled. Defaults to 3.
+        """
+        self.target_seconds = target_seconds
+        self.memory_limit = memory_limit
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_step = max_step
+        self.tolerance = tolerance
+        self.settle_batches = settle_batches
+        self.chunksize = max(min_rows, min(max_rows, int(initial)))
+        self.settled = None
+        self.history = []
+        self._stable = 0
+        self._lock = threading.Lock()
+
+    def size(self):
+        """Rows for the next chunk
+
+        Returns:
+            int: chunk size
+        """
+        with self._lock:
+            return self.chunksize
+
+    def observe(self, chunk, seconds):
+        """Record a written batch and resize the next chunks
+
+        Args:
+            chunk (pandas.DataFrame): written chunk
+            seconds (float): seconds spent writing chunk
+
+        Returns:
+            int: chunk size for the next chunks
+        """
+        rows = len(chunk.index)
+        if rows == 0:
+            return self.size()
+        memory = int(chunk.memory_usage(index=False, deep=True).sum())
+        rate = rows / max(seconds, 1e-6)
+        wanted = rate * self.target_seconds
+        if self.memory_limit is not None:
+            wanted = min(wanted, self.memory_limit / max(memory / rows, 1))
+        with self._lock:
+            current = self.chunksize
+            # the last chunk of a file is usually short, so steps are relative to the current size
+            wanted = max(current / self.max_step, min(current * self.max_step, wanted))
+            wanted = max(self.min_rows, min(self.max_rows, int(wanted)))
+            self.history.append({'rows': rows, 'seconds': seconds, 'rows_per_second': rate, 'memory': memory, 'next': wanted})
+            if abs(wanted - current) <= self.tolerance * current:
+                self._stable = self._stable + 1
+            else:
+                self._stable = 0
+                self.chunksize = wanted
+            if self.settled is None and self._stable >= self.settle_batches:
+                self.settled = self.chunksize
+            return self.chunksize
+
+def make_reader(file_kwargs, reader='auto'):
+    """Build csv reader for file_kwargs
+
+    Args:
+        file_kwargs (dict): parameters to interact with read_csv
+        reader (str or CsvReader, optional): 'auto', 'arrow', 'c', 'python' or a CsvReader instance.
+            'auto' honours an explicit engine in file_kwargs, uses the python engine only for dialects
+            that need it, then Arrow when installed and the C engine otherwise. Defaults to 'auto'.
+
+    Raises:
+        ValueError: Unknown reader
+
+    Returns:
+        CsvReader: reader for file_kwargs
+    """
+    if isinstance(reader, CsvReader):
+        return reader
+    kwargs = dict(file_kwargs)
+    if reader == 'auto':
+        sep = kwargs.get('sep', kwargs.get('delimiter', ','))
+        engine = kwargs.get('engine')
+        if engine is not None:
+            reader = 'arrow' if engine == 'pyarrow' else engine
+        elif sep is None or len(sep) > 1 or 'skipfooter' in kwargs:
+            reader = 'python'
+        elif ArrowCsvReader.supports(kwargs):
+            reader = 'arrow'
+        else:
+            reader = 'c'
+    kwargs.pop('engine', None)
+    if reader == 'arrow':
+        return ArrowCsvReader(kwargs)
+    if reader in ('c', 'python'):
+        return PandasCsvReader(kwargs, engine=reader)
+    raise ValueError(f'Unknown csv reader: {reader}')
+
 class MyDatabase:
     """Internal Class to handle My Database
     """
-    def __init__(self, server, database, log, schema='dbo'):
+    # string columns with at most this share of distinct values per chunk are loaded as categoricals
+    category_ratio = 0.05
+    # values read as True/False for bit columns
+    true_values = {'1', 'true', 't', 'yes', 'y'}
+    false_values = {'0', 'false', 'f', 'no', 'n'}
+    int_limits = {'int16': 2**15 - 1, 'int32': 2**31 - 1, 'int64': 2**63 - 1}
+    # format of datetime columns, 'mixed' parses every value on its own, a strftime format is faster
+    # when all values use it
+    datetime_format = 'mixed'
+    # bigint column holding the staged row hash for merge_data(row_hash=True)
+    row_hash_column = 'z_row_hash'
+
+    def __init__(self, server, database, log, schema='dbo', manifest=None, memory_tracker=None, url=None, engine_kwargs=None):
         """Constructor for class
 
         Args:
             server (str): server name
             database (str): database name
             log (logging): ETL log
+            manifest (LoadManifest, optional): skip loads of files unchanged since their last load. Defaults to None.
+            memory_tracker (performance.StageMemory, optional): attribute memory to the read_sql, read_csv, coerce,
+                to_sql and merge stages. Defaults to None.
+            url (str, optional): sqlalchemy url used instead of server and database, e.g. a SQLite or PostgreSQL
+                stand-in for benchmarks. Use schema=None for SQLite. Defaults to None.
+            engine_kwargs (dict, optional): pool_size, max_overflow, pool_pre_ping, pool_recycle or other
+                create_engine parameters, see get_engine. Defaults to None.
         """
         self.server = server
         self.database = database
         self.log = log
         self.schema = schema
+        self.manifest = manifest
+        self.memory_tracker = memory_tracker
+        self.url = url
+        self.engine_kwargs = engine_kwargs or {}
         self.engine = self.__build_engine()
+        # reflected target columns by table name
+        self._columns = {}
+        # cached MergePlan by (table, typed_source, row_hash)
+        self._merge_plans = {}
 
     def __build_engine(self):
-        """Create engine based on server and database
+        """Get shared engine based on server and database
 
         Returns:
-            sqlalchemy.create_engine: database engine
+            sqlalchemy.engine.Engine: database engine
         """
-        engine = create_engine(
-            'mssql+pyodbc://' + self.server + '/' + self.database + '?trusted_connection=yes&driver=SQL+Server&TrustServerCertificate=yes&Encrypt=yes',
-            fast_executemany=True)
+        engine = get_engine(self.url or mssql_url(self.server, self.database), **self.engine_kwargs)
         return engine
     
+    def _stage(self, name):
+        """Private method to open a memory stage on memory_tracker
+
+        Args:
+            name (str): stage name
+
+        Returns:
+            context manager: stage of memory_tracker, or a no-op without one
+        """
+        if self.memory_tracker is None:
+            return nullcontext()
+        return self.memory_tracker.stage(name)
+
+    def _target(self):
+        """Private method to identify this database and schema in the manifest
+
+        Returns:
+            str: see target_identity
+        """
+        return target_identity(self.engine.url, self.schema)
+
     def select_data(self, query):
         """select query on database
 
         Args:
-            query (str): select query for database
+            query (str): select query for database
+
+        Returns:
+            pandas.DataFrame: dataframe containing query
+        """
+        with self._stage('read_sql'):
+            df = pd.read_sql(query, self.engine)
+        return df
+
+    def stream_data(self, query, chunksize=10000, arrow=False):
+        """stream select query on database in chunks, only one chunk is held in memory.
+        Rows are fetched from an open cursor as the chunks are consumed.
+
+        Args:
+            query (str): select query for database
+            chunksize (int, optional): rows per chunk. Defaults to 10000.
+            arrow (bool, optional): yield pyarrow.RecordBatch instead of pandas.DataFrame. Defaults to False.
+
+        Yields:
+            pandas.DataFrame or pyarrow.RecordBatch: chunk of query results
+        """
+        if arrow:
+            import pyarrow as pa
+        with self.engine.connect() as con:
+            con = con.execution_options(stream_results=True)
+            for chunk in pd.read_sql(query, con, chunksize=chunksize):
+                if arrow:
+                    yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+                else:
+                    yield chunk
+
+    def export_data(self, query, file, file_format='parquet', chunksize=100000):
+        """stream select query on database to parquet or csv file without holding the full result in memory
+
+        Args:
+            query (str): select query for database
+            file (str): output file
+            file_format (str, optional): 'parquet' or 'csv'. Defaults to 'parquet'.
+            chunksize (int, optional): rows fetched and written at a time. Defaults to 100000.
+
+        Raises:
+            ValueError: Unknown file format
+
+        Returns:
+            int: rows written
+        """
+        if file_format not in ('parquet', 'csv'):
+            raise ValueError(f'Unknown file format: {file_format}')
+        total = 0
+        writer = None
+        try:
+            # GeoMyDatabase.stream_data takes a geometry column, export the plain rows
+            for chunk in MyDatabase.stream_data(self, query, chunksize):
+                if file_format == 'csv':
+                    chunk.to_csv(file, mode='w' if total == 0 else 'a', header=total == 0, index=False)
+                else:
+                    writer = self._write_parquet_chunk(writer, file, chunk)
+                total = total + len(chunk.index)
+                self.log.info(f'Exported Rows: {str(len(chunk.index))} Overall Rows: {str(total)} to {file}')
+        finally:
+            if writer is not None:
+                writer.close()
+        return total
+
+    @staticmethod
+    def _write_parquet_chunk(writer, file, chunk, metadata=None):
+        """Private method to append chunk to parquet file, opening the writer on the first chunk.
+        Columns that are all null in the first chunk are written as strings.
+
+        Args:
+            writer (pyarrow.parquet.ParquetWriter): open writer or None
+            file (str): output file
+            chunk (pandas.DataFrame): rows to write
+            metadata (dict, optional): schema metadata for a new writer. Defaults to None.
 
         Returns:
-            pandas.DataFrame: dataframe containing query
+            pyarrow.parquet.ParquetWriter: open writer
         """
-        df = pd.read_sql(query, self.engine)
-        return df
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema],
+                               metadata={**(schema.metadata or {}), **(metadata or {})})
+            writer = pq.ParquetWriter(file, schema)
+        writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+        return writer
     
     def truncate_table(self, table):
         """Delete records from table. Named truncate becuase all records are deleted
@@ -65,43 +1450,565 @@ class MyDatabase:
         else:
             self.log.info(f"{table} does not exist, skipping truncate")
 
+    def _table_columns(self, table):
+        """Private method to reflect table columns once per instance
+
+        Args:
+            table (str): name of table
+
+        Returns:
+            list: column dictionaries from sqlalchemy inspect in ordinal order
+        """
+        if table not in self._columns:
+            self._columns[table] = inspect(self.engine).get_columns(table, self.schema)
+        return self._columns[table]
+
+    def reflect_tables(self, tables):
+        """Reflect the columns of many tables into the column cache with one INFORMATION_SCHEMA
+        query on SQL Server and PostgreSQL. Other dialects are reflected table by table.
+        Tables already cached are not queried again.
+
+        Args:
+            tables (iterable): names of tables
+
+        Returns:
+            dict: table name and column dictionaries in ordinal order, tables that do not exist are left out
+        """
+        missing = sorted(set(tables) - set(self._columns))
+        if missing and self.engine.dialect.name in ('mssql', 'postgresql'):
+            query = text('select TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE from INFORMATION_SCHEMA.COLUMNS '
+                         'where TABLE_SCHEMA = :schema and TABLE_NAME in :tables order by TABLE_NAME, ORDINAL_POSITION')
+            query = query.bindparams(bindparam('tables', expanding=True))
+            type_names = self.engine.dialect.ischema_names
+            reflected = {}
+            with self.engine.connect() as con:
+                for row in con.execute(query, {'schema': self.schema, 'tables': missing}):
+                    col_type = type_names.get(row[2].lower(), sqltypes.NullType)
+                    reflected.setdefault(row[0], []).append({'name': row[1], 'type': col_type(), 'nullable': row[3] == 'YES'})
+            self._columns.update(reflected)
+        else:
+            insp = inspect(self.engine)
+            for table in missing:
+                if insp.has_table(table, self.schema):
+                    self._columns[table] = insp.get_columns(table, self.schema)
+        return {table: self._columns[table] for table in tables if table in self._columns}
+
+    def target_dtypes(self, table):
+        """Map target table columns to compact pandas dtypes
+
+        Args:
+            table (str): name of table
+
+        Returns:
+            dict: column name and dtype kind ('int16', 'int32', 'int64', 'float', 'decimal', 'bool', 'datetime' or 'string'),
+                without the row hash column
+        """
+        dtypes = {}
+        for column in self._table_columns(table):
+            if column['name'] == self.row_hash_column:
+                continue
+            col_type = column['type']
+            if isinstance(col_type, sqltypes.SmallInteger):
+                dtypes[column['name']] = 'int16'
+            elif isinstance(col_type, sqltypes.BigInteger):
+                dtypes[column['name']] = 'int64'
+            elif isinstance(col_type, sqltypes.Integer):
+                dtypes[column['name']] = 'int32'
+            elif isinstance(col_type, sqltypes.Float):
+                dtypes[column['name']] = 'float'
+            elif isinstance(col_type, sqltypes.Numeric):
+                # keep decimals as text so precision is not lost, values are only validated
+                dtypes[column['name']] = 'decimal'
+            elif isinstance(col_type, sqltypes.Boolean):
+                dtypes[column['name']] = 'bool'
+            elif isinstance(col_type, (sqltypes.DateTime, sqltypes.Date)):
+                dtypes[column['name']] = 'datetime'
+            else:
+                dtypes[column['name']] = 'string'
+        return dtypes
+
+    def _convert_column(self, values, kind):
+        """Private method to convert column of strings to dtype kind
+
+        Args:
+            values (pandas.Series): column of strings
+            kind (str): dtype kind from target_dtypes
+
+        Returns:
+            tuple: converted pandas.Series and boolean pandas.Series of values that failed to convert
+        """
+        if kind in self.int_limits and pd.api.types.is_integer_dtype(values.dtype):
+            # parsed as integers by the reader, only the range is checked
+            bad = (values.abs() > self.int_limits[kind]).fillna(False).astype(bool)
+            return values.where(~bad).astype(kind.capitalize()), bad
+        present = (values.notna() & (values.astype('string').str.strip() != '')).fillna(False).astype(bool)
+        if kind in ('int16', 'int32', 'int64', 'float', 'decimal'):
+            converted = pd.to_numeric(values.where(present), errors='coerce', dtype_backend='numpy_nullable')
+            bad = present & converted.isna()
+            if kind == 'decimal':
+                return values.where(present).astype(STRING_DTYPE), bad
+            if kind == 'float':
+                return converted.astype('Float64'), bad
+            bad = bad | (converted.notna() & (converted % 1 != 0)).fillna(False)
+            bad = bad | (converted.abs() > self.int_limits[kind]).fillna(False)
+            return converted.where(~bad).astype(kind.capitalize()), bad
+        if kind == 'bool':
+            lowered = values.astype('string').str.strip().str.lower()
+            converted = pd.Series(pd.NA, index=values.index, dtype='boolean')
+            converted[lowered.isin(self.true_values).fillna(False)] = True
+            converted[lowered.isin(self.false_values).fillna(False)] = False
+            return converted, present & converted.isna()
+        if kind == 'datetime':
+            converted = pd.to_datetime(values.where(present), errors='coerce', format=self.datetime_format)
+            return converted, present & converted.isna()
+        converted = values.astype(STRING_DTYPE)
+        if len(converted.index) > 0 and converted.nunique() <= len(converted.index) * self.category_ratio:
+            converted = converted.astype('category')
+        return converted, pd.Series(False, index=values.index)
+
+    def _chunk_coercer(self, dtypes, reject_file, keep_raw=False):
+        """Private method to build chunk function that converts columns to target dtypes
+        and moves rows that fail to convert to reject_file. Columns the reader already parsed
+        into their target dtype are kept as they are.
+
+        Args:
+            dtypes (dict): column name and dtype kind from target_dtypes
+            reject_file (str): csv file for rejected rows
+            keep_raw (bool, optional): return accepted rows as parsed strings instead of converted values. Defaults to False.
+
+        Returns:
+            callable: function taking and returning a pandas.DataFrame chunk
+        """
+        def coerce(chunk):
+            converted = {}
+            reasons = pd.Series('', index=chunk.index)
+            for column in chunk.columns:
+                if column not in dtypes or str(chunk[column].dtype) == TYPED_DTYPES.get(dtypes[column]):
+                    converted[column] = chunk[column]
+                    continue
+                converted[column], bad = self._convert_column(chunk[column], dtypes[column])
+                reasons = reasons.where(~bad, reasons + column + ';')
+            rejected = reasons != ''
+            if rejected.any():
+                rejects = chunk[rejected].copy()
+                rejects['reject_reason'] = reasons[rejected].str.rstrip(';')
+                rejects.to_csv(reject_file, mode='a', index=False, header=not os.path.exists(reject_file))
+                self.log.info(f'Rejected {str(int(rejected.sum()))} rows to {reject_file}')
+            if keep_raw:
+                return chunk[~rejected]
+            return pd.DataFrame(converted, index=chunk.index)[~rejected]
+        return coerce
+
+    @staticmethod
+    def row_hash(chunk):
+        """Hash every row of chunk from its text values, so the hash does not depend on
+        the reader or dtypes used
+
+        Args:
+            chunk (pandas.DataFrame): parsed rows
+
+        Returns:
+            numpy.ndarray: int64 hash per row
+        """
+        return pd.util.hash_pandas_object(chunk.fillna('').astype(str), index=False).values.view('int64')
+
     def update_database(self, table, file, capture_time=(False, None), file_kwargs={'sep':',',
-                                                                            'engine':'python',
                                                                              'dtype':str,
-                                                                             'chunksize':10000}):
+                                                                             'chunksize':10000},
+                        workers=1, max_in_flight=4, reader='auto', typed=False, reject_file=None, checkpoint=None, force=False,
+                        autotune=None, processes=None, range_bytes=1 << 26):
         """update database from csv file
 
         Args:
             table (str): name of table
             file (str): name of csv file
             capture_time (tuple), optional): generate timestamp. Defaults to (False, None).
-            file_kwargs (dict, optional): parameters to interact with read_csv. Defaults to {'sep':',', 'engine':'python', 'dtype':str, 'chunksize':10000}.
+            file_kwargs (dict, optional): parameters to interact with read_csv. Defaults to {'sep':',', 'dtype':str, 'chunksize':10000}.
+            workers (int, optional): number of writer threads, each with its own pooled connection.
+                Keep below pool_size + max_overflow of get_engine.
+                Values above 1 parse the next chunks while earlier chunks are inserted. Defaults to 1.
+            max_in_flight (int, optional): max number of parsed chunks waiting for a writer. Caps memory
+                in pipelined mode. Defaults to 4.
+            reader (str or CsvReader, optional): csv reader, see make_reader. Defaults to 'auto'.
+            typed (bool, optional): convert columns to the compact dtypes of the target table columns.
+                Rows that fail to convert are written to reject_file instead of failing the load. Blocks of records
+                are parsed straight into the target dtypes, a block with a value that does not convert is parsed as
+                text and only its failing rows are rejected. Defaults to False.
+            reject_file (str, optional): csv file for rejected rows. Defaults to file + '.rejects.csv'.
+            checkpoint (FileCheckpoint or TableCheckpoint, optional): record every committed batch and its byte
+                offsets. A rerun after a failure seeks past the committed batches instead of starting over. The
+                file must use an ASCII compatible encoding and the same chunksize on rerun. TableCheckpoint records
+                a batch in its transaction, FileCheckpoint once it committed, so a crash between commit and save
+                loads that batch again on rerun. Defaults to None.
+            force (bool, optional): load file even if the manifest has it as unchanged. Defaults to False.
+            autotune (bool or ChunkTuner, optional): size chunks adaptively instead of file_kwargs['chunksize'].
+                True uses a ChunkTuner starting at file_kwargs['chunksize']. Cannot be combined with checkpoint,
+                which needs a fixed chunksize. Defaults to None.
+            processes (int, optional): parse the file in byte ranges of about range_bytes, aligned to record
+                boundaries, in this many separate processes. Parsed ranges are cut into chunks in file order and
+                feed the writers, use workers > 1 to keep up. The file must be uncompressed with an ASCII compatible
+                encoding, and scripts must guard their entry point with if __name__ == '__main__' on Windows.
+                Cannot be combined with checkpoint. Defaults to None.
+            range_bytes (int, optional): target bytes per range with processes. Defaults to 64 MiB.
+
+        Raises:
+            ValueError: autotune or processes combined with checkpoint, processes on a compressed file
+
+        Returns:
+            dict: load summary with table, batches, rows and seconds spent writing each batch, skipped is True
+                when the file was unchanged, chunksize is the last chunk size when autotuned
         """
-        # Define variables for monitoring batches
-        batch = 0
-        rows = 0
-        total = 0
-        # Set up a loop of reading chunk and writing chunk to SQL Server. Ensure you set the right encoding for the file you are transferring in the parameters.
+        if autotune and checkpoint is not None:
+            raise ValueError('autotune cannot be combined with checkpoint, checkpoints need a fixed chunksize')
+        if processes and checkpoint is not None:
+            raise ValueError('processes cannot be combined with checkpoint')
+        if processes and detect_compression(file) is not None:
+            raise ValueError(f'{file} is compressed, byte ranges need an uncompressed file')
+        unchanged, fingerprint = check_manifest(self.manifest, file, table, force, self.log, self._target())
+        if unchanged:
+            return {'table': table, 'batches': 0, 'rows': 0, 'batch_seconds': [], 'skipped': True}
+        tuner = None
+        if autotune is True:
+            tuner = ChunkTuner(initial=file_kwargs.get('chunksize', 10000))
+        elif autotune:
+            tuner = autotune
+        coerce = None
+        dtypes = None
+        if typed:
+            dtypes = self.target_dtypes(table)
+            coerce = self._chunk_coercer(dtypes, reject_file or file + '.rejects.csv')
+        on_commit = None
+        after_commit = None
+        if checkpoint is not None:
+            chunksize = file_kwargs.get('chunksize', 10000)
+
+            def save(con, batch, chunk, span):
+                checkpoint.save(table, file, batch, span[0], span[1], len(chunk.index), chunksize, con=con)
+            if checkpoint.transactional:
+                on_commit = save
+            else:
+                after_commit = lambda batch, chunk, span: save(None, batch, chunk, span)
+        rows = tuner.size if tuner is not None else None
+        chunks = self._read_chunks(file, capture_time, file_kwargs, reader, coerce, checkpoint, table, rows,
+                                   processes, range_bytes, max_in_flight, dtypes)
+        if workers > 1:
+            summary = self._write_pipelined(table, chunks, workers, max_in_flight, on_commit, tuner, after_commit)
+        else:
+            summary = self._write_serial(table, chunks, on_commit, tuner, after_commit)
+        if tuner is not None:
+            summary['chunksize'] = tuner.size()
+            if tuner.settled is not None:
+                self.log.info('Table: ' + table + ' settled chunksize: ' + str(tuner.settled))
+            else:
+                self.log.info('Table: ' + table + ' chunksize did not settle, last chunksize: ' + str(summary['chunksize']))
+        if checkpoint is not None:
+            checkpoint.clear(table, file)
+        if self.manifest is not None:
+            self.manifest.record(file, table, fingerprint, self._target())
+        return summary
+
+    def _read_chunks(self, file, capture_time, file_kwargs, reader, coerce=None, checkpoint=None, table=None, rows=None,
+                     processes=None, range_bytes=1 << 26, max_in_flight=4, dtypes=None):
+        """Private generator to parse csv file into numbered chunks. With dtypes the file is read in
+        blocks of records that are parsed straight into the target dtypes, see parse_typed.
+
+        Args:
+            file (str): name of csv file
+            capture_time (tuple): generate timestamp (flag, column name)
+            file_kwargs (dict): parameters to interact with read_csv
+            reader (str or CsvReader): csv reader, see make_reader
+            coerce (callable, optional): function applied to every chunk before it is yielded. Defaults to None.
+            checkpoint (FileCheckpoint or TableCheckpoint, optional): skip batches already committed. Defaults to None.
+            table (str, optional): name of table the checkpoint belongs to. Defaults to None.
+            rows (callable, optional): called before every chunk for its row count. Defaults to None.
+            processes (int, optional): parse byte ranges in this many processes. Defaults to None.
+            range_bytes (int, optional): target bytes per range with processes. Defaults to 64 MiB.
+            max_in_flight (int, optional): max ranges being parsed ahead with processes. Defaults to 4.
+            dtypes (dict, optional): column name and dtype kind to parse columns into. Defaults to None.
+
+        Yields:
+            tuple: batch number, pandas.DataFrame chunk and (start, end) byte offsets or None
+        """
+        # Set up a loop of reading chunks. Ensure you set the right encoding for the file you are transferring in the parameters.
         if capture_time[0]:
             batch_date = datetime.datetime.now()
             if capture_time[1] is not None:
                 batch_date_col = capture_time[1]
             else:
                 batch_date_col = 'batch_date'
-        for chunk in pd.read_csv(file, **file_kwargs):
+        parser = make_reader(file_kwargs, reader)
+        if processes:
+            parsed = self._read_ranges(file, file_kwargs, parser, rows, processes, range_bytes, max_in_flight, dtypes)
+        elif checkpoint is not None or (dtypes and self._splits_records(file_kwargs)):
+            parsed = self._read_blocks(table, file, file_kwargs, parser, checkpoint, rows, dtypes)
+        else:
+            parsed = ((batch, chunk, None) for batch, chunk in enumerate(parser.chunks(file, rows), start=1))
+        parsed = iter(parsed)
+        while True:
+            with self._stage('read_csv'):
+                item = next(parsed, None)
+            if item is None:
+                break
+            batch, chunk, span = item
+            if coerce is not None:
+                with self._stage('coerce'):
+                    chunk = coerce(chunk)
             if capture_time[0]:
                 chunk[batch_date_col] = batch_date
-            chunk.to_sql(name=table, con=self.engine, schema=self.schema, method=None, if_exists='append', index=False)
-            # Print information about each batch that was written.
-            batch = batch + 1
-            rows = len(chunk.index)
-            total = total + rows
-            self.log.info('Table: ' + table + ' Batch: ' + str(batch) + ' Rows: ' + str(rows) + ' Overall Rows: ' + str(total))
+            yield batch, chunk, span
+
+    @staticmethod
+    def _splits_records(file_kwargs):
+        """Private method to check if a file can be cut into blocks of records below its header
+        record, which needs an ASCII compatible encoding and no skipped or renamed rows
+
+        Args:
+            file_kwargs (dict): parameters to interact with read_csv
+
+        Returns:
+            bool: True if the file can be read in record blocks
+        """
+        if set(file_kwargs) & {'names', 'skiprows', 'skipfooter', 'nrows', 'comment', 'lineterminator'}:
+            return False
+        if file_kwargs.get('header', 'infer') not in ('infer', 0):
+            return False
+        return b'\n"'.decode(file_kwargs.get('encoding', 'utf-8'), errors='replace') == '\n"'
+
+    def _read_blocks(self, table, file, file_kwargs, parser, checkpoint=None, rows=None, dtypes=None):
+        """Private generator to parse csv file in blocks of whole records with their byte offsets.
+        With a checkpoint, parsing starts after the last contiguous committed batch.
+
+        Args:
+            table (str): name of table
+            file (str): name of csv file
+            file_kwargs (dict): parameters to interact with read_csv
+            parser (CsvReader): reader used to parse blocks
+            checkpoint (FileCheckpoint or TableCheckpoint, optional): committed batches. Defaults to None.
+            rows (callable, optional): called before every block for its row count. Defaults to None.
+            dtypes (dict, optional): column name and dtype kind, see parse_typed. Defaults to None.
+
+        Raises:
+            ValueError: checkpoint was written with a different chunksize
+
+        Yields:
+            tuple: batch number, pandas.DataFrame chunk and (start, end) byte offsets
+        """
+        chunksize = file_kwargs.get('chunksize', 10000)
+        quotechar = file_kwargs.get('quotechar', '"').encode()
+        committed = {}
+        if checkpoint is not None:
+            committed = checkpoint.load(table, file)
+        if any(item['chunksize'] != chunksize for item in committed.values()):
+            raise ValueError(f'{file} was checkpointed with a different chunksize, rerun with the same chunksize or clear the checkpoint')
+        with open_source(file) as fh:
+            header = read_record(fh, quotechar)
+            # batches after a gap were committed by another writer and are skipped below
+            batch = 0
+            while batch + 1 in committed:
+                batch = batch + 1
+            if batch > 0:
+                seek_forward(fh, committed[batch]['end'])
+                self.log.info(f"Resuming Table: {table} after Batch: {str(batch)} at byte offset {str(committed[batch]['end'])}")
+            for block, start, end in iter_record_blocks(fh, rows or chunksize, quotechar):
+                batch = batch + 1
+                if batch in committed:
+                    continue
+                yield batch, parse_typed(parser, header + block, dtypes), (start, end)
+
+    def _read_ranges(self, file, file_kwargs, parser, rows, processes, range_bytes, max_in_flight, dtypes=None):
+        """Private generator to parse byte ranges of csv file in a process pool and cut the
+        parsed ranges into chunks in file order
+
+        Args:
+            file (str): name of csv file
+            file_kwargs (dict): parameters to interact with read_csv
+            parser (CsvReader): reader used to parse ranges
+            rows (callable): called before every chunk for its row count, or None for file_kwargs['chunksize']
+            processes (int): number of parser processes
+            range_bytes (int): target bytes per range
+            max_in_flight (int): max ranges submitted ahead of the chunk being yielded
+            dtypes (dict, optional): column name and dtype kind, see parse_typed. Defaults to None.
+
+        Yields:
+            tuple: batch number, pandas.DataFrame chunk and (start, end) byte offsets of its range
+        """
+        if rows is None:
+            chunksize = file_kwargs.get('chunksize', 10000)
+            rows = lambda: chunksize
+        quotechar = file_kwargs.get('quotechar', '"').encode()
+        batch = 0
+        with open(file, 'rb') as fh, ProcessPoolExecutor(max_workers=processes) as executor:
+            header = read_record(fh, quotechar)
+            ranges = iter_byte_ranges(fh, range_bytes, quotechar)
+            pending = deque()
+            for span in ranges:
+                pending.append((span, executor.submit(_parse_byte_range, file, header, span[0], span[1], file_kwargs, parser, dtypes)))
+                if len(pending) < max(processes, max_in_flight):
+                    continue
+                span, future = pending.popleft()
+                for chunk in self._cut_range(future.result(), rows):
+                    batch = batch + 1
+                    yield batch, chunk, span
+            while pending:
+                span, future = pending.popleft()
+                for chunk in self._cut_range(future.result(), rows):
+                    batch = batch + 1
+                    yield batch, chunk, span
+
+    @staticmethod
+    def _cut_range(frame, rows):
+        """Private generator to cut a parsed range into chunks
+
+        Args:
+            frame (pandas.DataFrame): parsed range
+            rows (callable): called before every chunk for its row count
+
+        Yields:
+            pandas.DataFrame: chunk of frame
+        """
+        start = 0
+        while start < len(frame.index):
+            size = rows()
+            yield frame.iloc[start:start + size].reset_index(drop=True)
+            start = start + size
+
+    def _write_chunk(self, table, chunk, con):
+        """Private method to append one chunk to table
+
+        Args:
+            table (str): name of table
+            chunk (pandas.DataFrame): chunk to write
+            con (sqlalchemy.engine.Connection): connection or engine to write with
+        """
+        chunk.to_sql(name=table, con=con, schema=self.schema, method=None, if_exists='append', index=False)
+
+    def _log_batch(self, summary, batch, rows, elapsed):
+        """Private method to record and log a written batch
+
+        Args:
+            summary (dict): load summary to update
+            batch (int): batch number
+            rows (int): rows in batch
+            elapsed (float): seconds spent writing batch
+        """
+        summary['batches'] = summary['batches'] + 1
+        summary['rows'] = summary['rows'] + rows
+        summary['batch_seconds'].append(elapsed)
+        # Print information about each batch that was written.
+        self.log.info('Table: ' + summary['table'] + ' Batch: ' + str(batch) + ' Rows: ' + str(rows) + ' Overall Rows: ' + str(summary['rows']))
+
+    def _write_serial(self, table, chunks, on_commit=None, tuner=None, after_commit=None):
+        """Private method to write chunks one after another
+
+        Args:
+            table (str): name of table
+            chunks (iterator): batch number, chunk and byte offsets
+            on_commit (callable, optional): called with connection, batch, chunk and offsets inside each batch transaction. Defaults to None.
+            tuner (ChunkTuner, optional): measures every written batch. Defaults to None.
+            after_commit (callable, optional): called with batch, chunk and offsets once each batch committed. Defaults to None.
+
+        Returns:
+            dict: load summary
+        """
+        summary = {'table': table, 'batches': 0, 'rows': 0, 'batch_seconds': []}
+        for batch, chunk, span in chunks:
+            start = time.perf_counter()
+            with self._stage('to_sql'), self.engine.begin() as con:
+                self._write_chunk(table, chunk, con)
+                if on_commit is not None:
+                    on_commit(con, batch, chunk, span)
+            if after_commit is not None:
+                after_commit(batch, chunk, span)
+            elapsed = time.perf_counter() - start
+            self._log_batch(summary, batch, len(chunk.index), elapsed)
+            if tuner is not None:
+                tuner.observe(chunk, elapsed)
+        return summary
+
+    def _write_pipelined(self, table, chunks, workers, max_in_flight, on_commit=None, tuner=None, after_commit=None):
+        """Private method to parse chunks into a bounded queue while writer threads insert them.
+        Each writer holds its own pooled connection and commits every chunk on its own, so batches
+        can finish out of order. The batch number in the log is the position of the chunk in the file.
+
+        Args:
+            table (str): name of table
+            chunks (iterator): batch number, chunk and byte offsets
+            workers (int): number of writer threads
+            max_in_flight (int): max parsed chunks waiting in the queue
+            on_commit (callable, optional): called with connection, batch, chunk and offsets inside each batch transaction. Defaults to None.
+            tuner (ChunkTuner, optional): measures every written batch, new sizes apply to chunks not parsed yet. Defaults to None.
+            after_commit (callable, optional): called with batch, chunk and offsets once each batch committed. Defaults to None.
+
+        Raises:
+            Exception: first error raised by a writer, after all writers have stopped
+
+        Returns:
+            dict: load summary
+        """
+        summary = {'table': table, 'batches': 0, 'rows': 0, 'batch_seconds': []}
+        work = queue.Queue(maxsize=max_in_flight)
+        lock = threading.Lock()
+        errors = []
+
+        def writer():
+            # writers keep draining the queue after an error so the reader never blocks on a full queue
+            con = None
+            try:
+                con = self.engine.connect()
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            try:
+                while True:
+                    item = work.get()
+                    if item is None:
+                        break
+                    if con is None or errors:
+                        continue
+                    batch, chunk, span = item
+                    start = time.perf_counter()
+                    try:
+                        with con.begin():
+                            self._write_chunk(table, chunk, con)
+                            if on_commit is not None:
+                                on_commit(con, batch, chunk, span)
+                        if after_commit is not None:
+                            after_commit(batch, chunk, span)
+                    except Exception as e:
+                        with lock:
+                            errors.append(e)
+                        continue
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        self._log_batch(summary, batch, len(chunk.index), elapsed)
+                    if tuner is not None:
+                        tuner.observe(chunk, elapsed)
+            finally:
+                if con is not None:
+                    con.close()
+
+        threads = [threading.Thread(target=writer, name=f'{table}-writer-{i}', daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for item in chunks:
+                if errors:
+                    break
+                work.put(item)
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        return summary
 
     def merge_data(self, table, file, file_kwargs={'sep':',',
-                                                                            'engine':'python',
                                                                              'dtype':str,
-                                                                             'chunksize':10000}):
+                                                                             'chunksize':10000},
+                   reader='auto', typed=False, reject_file=None, staging='shared', merge='procedure', merge_chunk_rows=100000,
+                   row_hash=False, force=False):
         """Merge data from z_dynamic_staging table to target table. Ensure 
         columns are labeled COL1, COL2, COL3 ... and z_merge_columns table has 
         metadata for sproc.
@@ -110,19 +2017,212 @@ class MyDatabase:
             table (str): name of table
             file (str): name of csv file
             capture_time (tuple), optional): generate timestamp. Defaults to (False, None).
-            file_kwargs (dict, optional): parameters to interact with read_csv. Defaults to {'sep':',', 'engine':'python', 'dtype':str, 'chunksize':10000}.
+            file_kwargs (dict, optional): parameters to interact with read_csv. Defaults to {'sep':',', 'dtype':str, 'chunksize':10000}.
+            reader (str or CsvReader, optional): csv reader, see make_reader. Defaults to 'auto'.
+            typed (bool, optional): validate COL1, COL2 ... against the dtypes of the target column at the same
+                ordinal position and write rows that fail to reject_file. Defaults to False.
+            reject_file (str, optional): csv file for rejected rows. Defaults to file + '.rejects.csv'.
+            staging (str, optional): 'shared' loads z_staging_dynamic, which must be empty. 'isolated' loads a
+                uniquely named staging table for this run and drops it afterwards, so merges into different
+                tables can run at the same time. With typed=True the isolated table has the target column types. Defaults to 'shared'.
+            merge (str, optional): 'procedure' runs usp_dynamic_merge. 'python' runs a cached MergePlan in key range
+                chunks of about merge_chunk_rows staging rows, each committed on its own. Defaults to 'procedure'.
+            merge_chunk_rows (int, optional): staging rows per MERGE chunk with merge='python'. Defaults to 100000.
+            row_hash (bool, optional): stage a hash of every source row in the row_hash_column and only update target
+                rows whose stored hash differs. The target table needs a bigint row_hash_column. Requires
+                staging='isolated' and merge='python'. Defaults to False.
+            force (bool, optional): merge file even if the manifest has it as unchanged. Defaults to False.
+
+        Returns:
+            list: per chunk merge summaries with inserted, updated and unchanged rows with merge='python', otherwise None
         Raises:
             DatabaseMergeError: Staging table has records and must be cleared first
+            ValueError: Unknown staging mode or row_hash without isolated staging and python merge
+        """
+        if row_hash and (staging != 'isolated' or merge != 'python'):
+            raise ValueError("row_hash requires staging='isolated' and merge='python'")
+        unchanged, fingerprint = check_manifest(self.manifest, file, table, force, self.log, self._target())
+        if unchanged:
+            return None
+        if staging == 'shared':
+            df = self.select_data('select COL1 from z_staging_dynamic')
+            if df['COL1'].count() > 0:
+                raise DatabaseMergeError(f"Table contains {str(df['COL1'].count())} records, clear table before merging data")
+            staging_table = 'z_staging_dynamic'
+        elif staging == 'isolated':
+            staging_table = self._create_staging(table, typed, row_hash)
+        else:
+            raise ValueError(f'Unknown staging mode: {staging}')
+        try:
+            capture_time=(False, None)
+            coerce = None
+            parse_dtypes = None
+            if typed:
+                # varchar staging keeps accepted rows as parsed text, typed staging takes converted values
+                dtypes = {f'COL{str(i+1)}': kind for i, kind in enumerate(self.target_dtypes(table).values())}
+                coerce = self._chunk_coercer(dtypes, reject_file or file + '.rejects.csv', keep_raw=staging == 'shared')
+                # row hashes are taken from the parsed text, so rows are only parsed typed without them
+                if staging == 'isolated' and not row_hash:
+                    parse_dtypes = dtypes
+            if row_hash:
+                coerce = self._hashing_coercer(coerce)
+            chunks = self._read_chunks(file, capture_time, file_kwargs, reader, coerce, dtypes=parse_dtypes)
+            self._write_serial(staging_table, chunks)
+            self.log.info(f"merging data to {table}")
+            chunk_summaries = None
+            with self._stage('merge'):
+                if merge == 'python':
+                    plan = self.merge_plan(table, typed_source=typed and staging == 'isolated', row_hash=row_hash)
+                    chunk_summaries = self.run_merge(plan, staging_table, merge_chunk_rows)
+                    if staging == 'shared':
+                        self.truncate_table(staging_table)
+                else:
+                    with self.engine.begin() as con:
+                            con.execute(f"usp_dynamic_merge '{table}', '[{self.schema}].[{staging_table}]'")
+            if self.manifest is not None:
+                self.manifest.record(file, table, fingerprint, self._target())
+            return chunk_summaries
+        finally:
+            if staging == 'isolated':
+                self._drop_staging(staging_table)
+
+    def _create_staging(self, table, typed=False, row_hash=False):
+        """Private method to create a staging table for one merge run
+
+        Args:
+            table (str): name of target table
+            typed (bool, optional): use target column types for COL1, COL2 ... instead of varchar. Defaults to False.
+            row_hash (bool, optional): add bigint row_hash_column. Defaults to False.
+
+        Returns:
+            str: name of staging table
+        """
+        staging_table = f'z_staging_{table}_{uuid.uuid4().hex[:8]}'
+        hash_col = f', cast(null as bigint) as [{self.row_hash_column}]' if row_hash else ''
+        if typed:
+            data_columns = [c for c in self._table_columns(table) if c['name'] != self.row_hash_column]
+            columns = ', '.join(f"[{c['name']}] AS COL{str(i+1)}" for i, c in enumerate(data_columns))
+            # the join stops select into from copying identity columns
+            query = (f'select top 0 {columns}{hash_col} into [{self.schema}].[{staging_table}] '
+                     f'from [{self.schema}].[{table}] left join (select 1 as z) as z_no_identity on 1 = 0;')
+        else:
+            query = f'select top 0 *{hash_col} into [{self.schema}].[{staging_table}] from [{self.schema}].[z_staging_dynamic];'
+        with self.engine.begin() as con:
+            con.execute(query)
+        self.log.info(f'Created staging table {staging_table}')
+        return staging_table
+
+    def _hashing_coercer(self, coerce):
+        """Private method to wrap chunk function so rows get row_hash_column computed from
+        their parsed text, before any type conversion
+
+        Args:
+            coerce (callable): chunk function from _chunk_coercer or None
+
+        Returns:
+            callable: function taking and returning a pandas.DataFrame chunk
+        """
+        def hash_chunk(chunk):
+            hashes = pd.Series(self.row_hash(chunk), index=chunk.index)
+            if coerce is not None:
+                chunk = coerce(chunk)
+            chunk[self.row_hash_column] = hashes.reindex(chunk.index)
+            return chunk
+        return hash_chunk
+
+    def _drop_staging(self, staging_table):
+        """Private method to drop a staging table created by _create_staging
+
+        Args:
+            staging_table (str): name of staging table
         """
-        df = self.select_data('select COL1 from z_staging_dynamic')
-        if df['COL1'].count() > 0:
-            raise DatabaseMergeError(f"Table contains {str(df['COL1'].count())} records, clear table before merging data")
-        capture_time=(False, None)
-        self.update_database('z_staging_dynamic', file, capture_time, file_kwargs)
-        self.log.info(f"merging data to {table}")
         with self.engine.begin() as con:
-                con.execute(f"usp_dynamic_merge {table}")
+            con.execute(f'drop table if exists [{self.schema}].[{staging_table}];')
+        self.log.info(f'Dropped staging table {staging_table}')
     
+    def merge_plan(self, table, typed_source=False, row_hash=False):
+        """Get MERGE plan for table. Plans are cached per instance and rebuilt when the
+        target table is altered or its z_merge_columns rows change.
+
+        Args:
+            table (str): name of target table
+            typed_source (bool, optional): staging columns already have target types. Defaults to False.
+            row_hash (bool, optional): skip matched rows whose row_hash_column is unchanged. Defaults to False.
+
+        Raises:
+            DatabaseMergeError: table has no merge columns in z_merge_columns or no row_hash_column
+
+        Returns:
+            MergePlan: plan for table
+        """
+        version_query = text("select (select modify_date from sys.objects where object_id = object_id(:qualified)) as modified, "
+                             "(select checksum_agg(checksum(source_col, target_col)) from z_merge_columns where target_table = :table) as keys_checksum")
+        with self.engine.connect() as con:
+            row = con.execute(version_query, {'qualified': f'[{self.schema}].[{table}]', 'table': table}).fetchone()
+        version = (row[0], row[1])
+        plan = self._merge_plans.get((table, typed_source, row_hash))
+        if plan is not None and plan.version == version:
+            return plan
+        # schema changed, drop reflected columns as well
+        self._columns.pop(table, None)
+        columns_query = text('select COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE '
+                             'from INFORMATION_SCHEMA.COLUMNS where TABLE_SCHEMA = :schema and TABLE_NAME = :table order by ORDINAL_POSITION')
+        keys_query = text('select source_col, target_col from z_merge_columns where target_table = :table')
+        columns = pd.read_sql(columns_query, self.engine, params={'schema': self.schema, 'table': table}).to_dict('records')
+        keys = [tuple(k) for k in pd.read_sql(keys_query, self.engine, params={'table': table}).itertuples(index=False)]
+        if len(keys) == 0:
+            raise DatabaseMergeError(f'{table} has no merge columns in z_merge_columns')
+        if row_hash and self.row_hash_column not in [c['COLUMN_NAME'] for c in columns]:
+            raise DatabaseMergeError(f'{table} has no {self.row_hash_column} column for row hashes')
+        plan = MergePlan(table, self.schema, columns, keys, version, typed_source, self.row_hash_column if row_hash else None)
+        self._merge_plans[(table, typed_source, row_hash)] = plan
+        self.log.info(f'Built merge plan for {table}')
+        return plan
+
+    def run_merge(self, plan, staging_table, chunk_rows=100000):
+        """Run MERGE plan from staging table in chunks split on the first merge key.
+        Chunks cover half open key ranges so every staging row is merged once, rows with
+        a null key are merged in a last chunk.
+
+        Args:
+            plan (MergePlan): plan for target table
+            staging_table (str): name of staging table in schema
+            chunk_rows (int, optional): staging rows per chunk. Defaults to 100000.
+
+        Returns:
+            list: dict per chunk with chunk number, inserted, updated and unchanged rows and seconds
+        """
+        source = f'[{self.schema}].[{staging_table}]'
+        key = plan.source_key(*plan.keys[0])
+        with self.engine.connect() as con:
+            total = con.execute(f'select count(*) from {source}').scalar()
+        chunks = max(1, -(-total // chunk_rows))
+        bounds_query = (f'select z_chunk, max(z_key) as hi from (select {key} as z_key, ntile({str(chunks)}) over (order by {key}) as z_chunk '
+                        f'from {source} as Source where {key} is not null) as z_keys group by z_chunk order by z_chunk')
+        bounds = pd.read_sql(bounds_query, self.engine)['hi'].tolist()
+        filters = []
+        low = None
+        for high in bounds:
+            if low is not None and high == low:
+                continue
+            filters.append((f'{key} <= :hi' if low is None else f'{key} > :lo and {key} <= :hi', {'lo': low, 'hi': high}))
+            low = high
+        filters.append((f'{key} is null', {}))
+        summaries = []
+        for i, (where, params) in enumerate(filters):
+            start = time.perf_counter()
+            with self.engine.begin() as con:
+                counts = con.execute(text(plan.sql(source, where)), {k: v for k, v in params.items() if ':' + k in where}).fetchone()
+            source_rows, inserted, updated = (int(v or 0) for v in counts)
+            summary = {'chunk': i + 1, 'inserted': inserted, 'updated': updated, 'unchanged': source_rows - inserted - updated,
+                       'seconds': time.perf_counter() - start}
+            summaries.append(summary)
+            self.log.info('Merge Table: ' + plan.target + ' Chunk: ' + str(summary['chunk']) + ' Inserted: ' + str(inserted)
+                          + ' Updated: ' + str(updated) + ' Unchanged: ' + str(summary['unchanged']) + ' Seconds: ' + '{:.2f}'.format(summary['seconds']))
+        self.log.info('Merge Table: ' + plan.target + ' Inserted: ' + str(sum(x['inserted'] for x in summaries))
+                      + ' Updated: ' + str(sum(x['updated'] for x in summaries)) + ' Unchanged: ' + str(sum(x['unchanged'] for x in summaries)))
+        return summaries
+
     @staticmethod
     def format_merge_columns(df):
         """Utility method to change DataFrame columns to COL1, COL2, COL3....
@@ -143,83 +2243,191 @@ class MyDatabase:
         return df
     
     def schema_check(self, sources, metadata_cols=None, file_kwargs={'sep':'|',
-                                                 'engine':'python',
                                                  'dtype': str,
-                                                 'nrows': 2}):
-        """Check if any files have new columns that are not in database table.
+                                                 'nrows': 2},
+                     reader='auto', workers=8, raise_on_change=True, refresh=True):
+        """Check if any files have new, missing or retyped columns compared to their database table.
+        All tables are reflected with one metadata query and cached, and files are checked in a thread pool.
 
         Args:
             sources (dict): Dictionary containing table_name and file_name. Example {'my_table': 'C:\\Users\\MyMember\\test.csv'}
-            file_kwargs (dict, optional): parameters to interact with read_csv. Defaults to {'sep':'|', 'engine':'python', 'dtype':str, 'nrows': 2}.
+            metadata_cols (list, optional): table columns added by the load that are not in the files. Defaults to None.
+            file_kwargs (dict, optional): parameters to interact with read_csv. Column names are read from the first line,
+                and the first nrows rows are checked against the table column types. Defaults to {'sep':'|', 'dtype':str, 'nrows': 2}.
+            reader (str or CsvReader, optional): csv reader, see make_reader. Defaults to 'auto'.
+            workers (int, optional): threads reading files. Defaults to 8.
+            raise_on_change (bool, optional): raise when any source differs from its table. Defaults to True.
+            refresh (bool, optional): reflect the tables again instead of using columns cached by earlier
+                calls, so tables altered since are compared as they are now. Defaults to True.
 
         Raises:
-            ValueError: Data Source has new columns
+            ValueError: Data Source has new, missing or retyped columns
+
+        Returns:
+            dict: table name and diff with file, added, removed and retyped columns, and missing_table when the table does not exist
         """
-        
-        schema_check = []
         self.log.info("checking schema changes")
-        for key, value in sources.items():
-            result = self._compare_sources(value, key, metadata_cols, file_kwargs)
-            schema_check.append(result)
-        if sum(schema_check) > 0:
-            raise ValueError('Data Source has new columns!')
-        else:
-            return None
-    
-    def _compare_sources(self, file, table, metadata_cols, file_kwargs):
+        if refresh:
+            for table in sources:
+                self._columns.pop(table, None)
+        self.reflect_tables(sources.keys())
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources)))) as executor:
+            futures = {table: executor.submit(self._compare_sources, file, table, metadata_cols, file_kwargs, reader)
+                       for table, file in sources.items()}
+            diffs = {table: future.result() for table, future in futures.items()}
+        changed = [table for table, diff in diffs.items()
+                   if diff['missing_table'] or diff['added'] or diff['removed'] or diff['retyped']]
+        if changed and raise_on_change:
+            raise ValueError(f'Data Source has new columns! Changed tables: {changed}')
+        return diffs
+
+    def _compare_sources(self, file, table, metadata_cols, file_kwargs, reader='auto'):
         """Compare file to table
 
         Args:
             file (str): file to read
             table (str): database table
+            metadata_cols (list): table columns added by the load that are not in the file
             file_kwargs (dict): parameters to interact with read_csv.
+            reader (str or CsvReader, optional): csv reader, see make_reader. Defaults to 'auto'.
 
         Returns:
-            int: 0 if new columns are not found else 1 
+            dict: file, added, removed and retyped columns, and missing_table
         """
-        df = pd.read_csv(file, **file_kwargs)
-        if metadata_cols:
-            for item in metadata_cols:
-                df[item] = None
-        file_columns = df.columns.values.tolist()
-        insp = inspect(self.engine)
-        columns_table = insp.get_columns(table, self.schema)
-        db_columns = [c['name'] for c in columns_table]
-        file_columns.sort()
-        db_columns.sort()
-        if file_columns == db_columns:
-            self.log.info(f'{file}: no changes')
-            return 0
+        diff = {'file': file, 'missing_table': False, 'added': [], 'removed': [], 'retyped': []}
+        if table not in self._columns:
+            diff['missing_table'] = True
+            self.log.info(f'{file}: table {table} does not exist')
+            return diff
+        parser = make_reader(file_kwargs, reader)
+        file_columns = parser.header(file) + list(metadata_cols or [])
+        db_columns = [c['name'] for c in self._columns[table]]
+        diff['added'] = [c for c in file_columns if c not in db_columns]
+        diff['removed'] = [c for c in db_columns if c not in file_columns and c != self.row_hash_column]
+        if file_kwargs.get('nrows'):
+            sample = parser.frame(file)
+            for column, kind in self.target_dtypes(table).items():
+                if column not in sample.columns or kind == 'string':
+                    continue
+                _, bad = self._convert_column(sample[column], kind)
+                if bad.any():
+                    diff['retyped'].append({'column': column, 'type': kind, 'value': str(sample[column][bad].iloc[0])})
+        if diff['added'] or diff['removed'] or diff['retyped']:
+            self.log.info(f"{file} has new columns: {diff['added']} missing columns: {diff['removed']} "
+                          f"retyped columns: {[item['column'] for item in diff['retyped']]}")
         else:
-            self.log.info(f'{file} has new columns: {[source for source in file_columns if source not in db_columns]}')
-            return 1
+            self.log.info(f'{file}: no changes')
+        return diff
 
+# geopandas, shapely and pyproj are imported by the GeoMyDatabase methods that use them,
+# so importing this module for tabular loads does not pay for the spatial stack
 class GeoMyDatabase(MyDatabase):
-    """Extended MyDatabase class to interact with spatial data
+    """Extended MyDatabase class to interact with spatial data. Geometry columns are decoded
+    as whole arrays, select them as WKT with geom.STAsText() or as WKB with geom.STAsBinary().
+    WKB skips text formatting on the server and parsing on the client.
     """
-    def __init__(self, server, database, log):
-        super().__init__(server, database, log)
-    def select_data(self, query, column):
+    crs = 'EPSG:4326'
+
+    def __init__(self, server, database, log, engine_kwargs=None):
+        super().__init__(server, database, log, engine_kwargs=engine_kwargs)
+    def select_data(self, query, column, geometry_format='wkt'):
         """select data from database with spatial column
 
         Args:
-            query (str): Spatial SQL query with WKT formatted column
-            column (str): WKT column of spatial data
+            query (str): Spatial SQL query with WKT or WKB formatted column
+            column (str): WKT or WKB column of spatial data
+            geometry_format (str, optional): 'wkt' or 'wkb'. Defaults to 'wkt'.
 
         Returns:
             geopandas.GeoDataFrame: GeoDataFrame of select query with WKT as geometry
         """
         df = super().select_data(query)
-        df['geometry'] = df[column].apply(wkt.loads)
-        gdf = gpd.GeoDataFrame(df, geometry='geometry', crs='EPSG:4326')
-        gdf.drop(columns=[column], inplace=True, axis=1)
+        return self._to_geodataframe(df, column, geometry_format)
+
+    def stream_data(self, query, column, chunksize=10000, geometry_format='wkt'):
+        """stream select query on database with spatial column in chunks
+
+        Args:
+            query (str): Spatial SQL query with WKT or WKB formatted column
+            column (str): WKT or WKB column of spatial data
+            chunksize (int, optional): rows per chunk. Defaults to 10000.
+            geometry_format (str, optional): 'wkt' or 'wkb'. Defaults to 'wkt'.
+
+        Yields:
+            geopandas.GeoDataFrame: chunk of query results with WKT as geometry
+        """
+        for chunk in super().stream_data(query, chunksize):
+            yield self._to_geodataframe(chunk, column, geometry_format)
+
+    def export_geoparquet(self, query, column, file, geometry_format='wkt', chunksize=100000):
+        """stream select query on database with spatial column to a GeoParquet file. WKB columns
+        are written as they are fetched, WKT columns are converted to WKB array by array.
+
+        Args:
+            query (str): Spatial SQL query with WKT or WKB formatted column
+            column (str): WKT or WKB column of spatial data
+            file (str): output file
+            geometry_format (str, optional): 'wkt' or 'wkb'. Defaults to 'wkt'.
+            chunksize (int, optional): rows fetched and written at a time. Defaults to 100000.
+
+        Returns:
+            int: rows written
+        """
+        import pyproj
+        import shapely
+        geo = {'version': '1.0.0',
+               'primary_column': 'geometry',
+               'columns': {'geometry': {'encoding': 'WKB',
+                                        'geometry_types': [],
+                                        'crs': pyproj.CRS.from_user_input(self.crs).to_json_dict()}}}
+        total = 0
+        writer = None
+        try:
+            for chunk in MyDatabase.stream_data(self, query, chunksize):
+                if geometry_format == 'wkt':
+                    chunk['geometry'] = shapely.to_wkb(shapely.from_wkt(chunk[column].values))
+                else:
+                    chunk['geometry'] = chunk[column]
+                chunk = chunk.drop(columns=[column])
+                writer = self._write_parquet_chunk(writer, file, chunk, {b'geo': json.dumps(geo).encode()})
+                total = total + len(chunk.index)
+                self.log.info(f'Exported Rows: {str(len(chunk.index))} Overall Rows: {str(total)} to {file}')
+        finally:
+            if writer is not None:
+                writer.close()
+        return total
+
+    @classmethod
+    def _to_geodataframe(cls, df, column, geometry_format='wkt'):
+        """Private method to convert WKT or WKB column of DataFrame to geometry in one
+        vectorized call
+
+        Args:
+            df (pandas.DataFrame): query results
+            column (str): WKT or WKB column of spatial data
+            geometry_format (str, optional): 'wkt' or 'wkb'. Defaults to 'wkt'.
+
+        Raises:
+            ValueError: Unknown geometry format
+
+        Returns:
+            geopandas.GeoDataFrame: GeoDataFrame with WKT as geometry
+        """
+        import geopandas as gpd
+        if geometry_format == 'wkt':
+            geometry = gpd.GeoSeries.from_wkt(df[column].values, index=df.index, crs=cls.crs)
+        elif geometry_format == 'wkb':
+            geometry = gpd.GeoSeries.from_wkb(df[column].values, index=df.index, crs=cls.crs)
+        else:
+            raise ValueError(f'Unknown geometry format: {geometry_format}')
+        gdf = gpd.GeoDataFrame(df.drop(columns=[column]), geometry=geometry, crs=cls.crs)
         return gdf
 
 class ImportDbaCsvAdapter:
     """A class to import flat files to My Database based on PowerShell Import-DbaCsv 
     dbatools: https://docs.dbatools.io/Import-DbaCsv 
     """
-    def __init__(self, log, server, database, source, target, delimiter, truncate=False, schema='dbo'):
+    def __init__(self, log, server, database, source, target, delimiter, truncate=False, schema='dbo', manifest=None, force=False):
         """Constructor for class
 
         Args:
@@ -230,6 +2438,8 @@ class ImportDbaCsvAdapter:
             target (str): database table name
             delimiter (str): file delimiter (tab, pipe, semicolon, space, and comma)
             truncate (bool, optional): Bool to truncate table. Defaults to False.
+            manifest (LoadManifest, optional): skip files unchanged since their last import. Defaults to None.
+            force (bool, optional): import file even if unchanged. Defaults to False.
         """
         self.log = log
         self.server = server
@@ -239,10 +2449,23 @@ class ImportDbaCsvAdapter:
         self.delimiter = delimiter
         self.truncate = truncate
         self.schema = schema
+        self.manifest = manifest
+        self.force = force
     
+    def _identity(self):
+        """Private method to identify the target database and schema in the manifest
+
+        Returns:
+            str: see target_identity
+        """
+        return target_identity(mssql_url(self.server, self.database), self.schema)
+
     def upload_file(self):
         """Run PowerShell script to import files
         """
+        unchanged, fingerprint = check_manifest(self.manifest, self.source, self.target, self.force, self.log, self._identity())
+        if unchanged:
+            return None
         # prepare statement to run truncate
         if self.truncate:
             command = f'Import-DbaCsv -Path {self.source} -SqlInstance {self.server} -Database {self.database} -Table {self.target} -Schema {self.schema} -Truncate -Delimiter "{self.delimiter}" -AutoCreateTable -EnableException'
@@ -259,5 +2482,189 @@ class ImportDbaCsvAdapter:
             raise ImportDBACsvError(proc.stderr)
         else:
             self.log.info(proc.stdout)
-            
-            
+            if self.manifest is not None:
+                self.manifest.record(self.source, self.target, fingerprint, self._identity())
+
+class BulkCsvImporter:
+    """A class to import flat files with python, same contract as ImportDbaCsvAdapter
+    (truncate, auto create table, delimiter) without PowerShell. Postgres loads with
+    COPY, other databases with executemany batches (fast_executemany on SQL Server).
+
+    Example:
+
+    importers = [BulkCsvImporter(log, url, f, f.replace('.csv', ''), 'comma', truncate=True) for f in files]
+    upload_files(importers, workers=4)
+    """
+    delimiters = {'tab': '\t', 'pipe': '|', 'semicolon': ';', 'space': ' ', 'comma': ','}
+
+    def __init__(self, log, url, source, target, delimiter, truncate=False, schema='dbo', batch_rows=50000, manifest=None, force=False,
+                 engine_kwargs=None):
+        """Constructor for class
+
+        Args:
+            log (logging): ETL log
+            url (str): sqlalchemy connection url, see mssql_url
+            source (str): path and file of database
+            target (str): database table name
+            delimiter (str): file delimiter (tab, pipe, semicolon, space, and comma) or the character itself
+            truncate (bool, optional): Bool to truncate table. Defaults to False.
+            schema (str, optional): database schema. Defaults to 'dbo'.
+            batch_rows (int, optional): rows per executemany batch. Defaults to 50000.
+            manifest (LoadManifest, optional): skip files unchanged since their last import. Defaults to None.
+            force (bool, optional): import file even if unchanged. Defaults to False.
+            engine_kwargs (dict, optional): pool settings and other create_engine parameters, see get_engine. Defaults to None.
+        """
+        self.log = log
+        self.url = url
+        self.source = source
+        self.target = target
+        self.delimiter = self.delimiters.get(delimiter, delimiter)
+        self.truncate = truncate
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self.manifest = manifest
+        self.force = force
+        self.engine_kwargs = engine_kwargs or {}
+
+    def _identity(self):
+        """Private method to identify the target database and schema in the manifest
+
+        Returns:
+            str: see target_identity
+        """
+        return target_identity(self.url, self.schema)
+
+    def upload_file(self):
+        """Import file, truncate and load run in one transaction
+
+        Raises:
+            BulkImportError: file could not be imported
+
+        Returns:
+            int: rows imported, 0 when the file was unchanged
+        """
+        unchanged, fingerprint = check_manifest(self.manifest, self.source, self.target, self.force, self.log, self._identity())
+        if unchanged:
+            return 0
+        engine = get_engine(self.url, **self.engine_kwargs)
+        try:
+            with open(self.source, 'r', newline='', encoding='utf-8-sig') as f:
+                columns = next(csv.reader(f, delimiter=self.delimiter))
+            self._create_table(engine, columns)
+            if engine.dialect.name == 'postgresql':
+                rows = self._copy(engine, columns)
+            else:
+                rows = self._executemany(engine)
+        except Exception as e:
+            raise BulkImportError(f'{self.source}: {e}') from e
+        self.log.info(f'Imported {str(rows)} rows from {self.source} to {self.schema}.{self.target}')
+        if self.manifest is not None:
+            self.manifest.record(self.source, self.target, fingerprint, self._identity())
+        return rows
+
+    def _create_table(self, engine, columns):
+        """Private method to create text columns table from the file header if it does not exist
+
+        Args:
+            engine (sqlalchemy.engine.Engine): database engine
+            columns (list): column names
+        """
+        if not inspect(engine).has_table(self.target, schema=self.schema):
+            pd.DataFrame(columns=columns, dtype=str).to_sql(self.target, con=engine, schema=self.schema, index=False)
+            self.log.info(f'Created table {self.schema}.{self.target}')
+
+    def _qualified(self, engine):
+        """Private method to quote schema and table for the engine dialect
+
+        Args:
+            engine (sqlalchemy.engine.Engine): database engine
+
+        Returns:
+            str: quoted schema.table
+        """
+        preparer = engine.dialect.identifier_preparer
+        return preparer.quote_schema(self.schema) + '.' + preparer.quote(self.target)
+
+    def _truncate(self, con, qualified):
+        """Private method to delete records on an open transaction
+
+        Args:
+            con (sqlalchemy.engine.Connection or DBAPI cursor): connection to execute on
+            qualified (str): quoted schema.table
+        """
+        if self.truncate:
+            con.execute(f'delete from {qualified};')
+            self.log.info('Truncated Table ' + self.target)
+
+    def _copy(self, engine, columns):
+        """Private method to stream file through postgres COPY
+
+        Args:
+            engine (sqlalchemy.engine.Engine): postgres engine
+            columns (list): column names
+
+        Returns:
+            int: rows imported
+        """
+        column_list = ', '.join('"' + c.replace('"', '""') + '"' for c in columns)
+        delimiter = self.delimiter.replace("'", "''")
+        query = (f'COPY {self._qualified(engine)} ({column_list}) FROM STDIN '
+                 f"WITH (FORMAT csv, HEADER true, DELIMITER '{delimiter}')")
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            self._truncate(cursor, self._qualified(engine))
+            with open(self.source, 'r', newline='', encoding='utf-8-sig') as f:
+                cursor.copy_expert(query, f)
+            rows = cursor.rowcount
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+        return rows
+
+    def _executemany(self, engine):
+        """Private method to insert file in executemany batches
+
+        Args:
+            engine (sqlalchemy.engine.Engine): database engine
+
+        Returns:
+            int: rows imported
+        """
+        rows = 0
+        reader = make_reader({'sep': self.delimiter, 'dtype': str, 'chunksize': self.batch_rows})
+        with engine.begin() as con:
+            self._truncate(con, self._qualified(engine))
+            for chunk in reader.chunks(self.source):
+                chunk.to_sql(self.target, con=con, schema=self.schema, method=None, if_exists='append', index=False)
+                rows = rows + len(chunk.index)
+        return rows
+
+def upload_files(importers, workers=4):
+    """Run importers concurrently
+
+    Args:
+        importers (list): BulkCsvImporter or ImportDbaCsvAdapter objects
+        workers (int, optional): files imported at the same time. Defaults to 4.
+
+    Raises:
+        BulkImportError: one or more files failed, raised after every file finished
+
+    Returns:
+        dict: source file and rows imported
+    """
+    results = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(importer.upload_file): importer for importer in importers}
+        for future in as_completed(futures):
+            try:
+                results[futures[future].source] = future.result()
+            except Exception as e:
+                errors.append(str(e))
+    if errors:
+        raise BulkImportError('; '.join(errors))
+    return results
@@ -0,0 +1,94 @@
+"""Import time budget for pipeline entry points. Each module is imported in a fresh interpreter
+with python -X importtime, so luigi workers and --help pay what is measured here.
+
+Example:
+
+python -m DADPy.etl.import_budget --path C:\\DADPy\\etl luigi_pipeline_example=300 DADPy.etl.tasks=250
+python -m DADPy.etl.import_budget --path C:\\VCA run_etl=50 --repeat 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# import time:     self [us] |  cumulative | imported package
+IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+def measure(module, path=None):
+    """Import module in a fresh interpreter and collect import times
+
+    Args:
+        module (str): module to import
+        path (str, optional): working directory, added to PYTHONPATH. Defaults to current directory.
+
+    Raises:
+        ImportError: module failed to import
+
+    Returns:
+        dict: total_ms of module and imports, list of (name, self_ms, cumulative_ms)
+    """
+    path = os.path.abspath(path or os.getcwd())
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (path, env.get('PYTHONPATH')) if p)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=path, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(f'{module} failed to import: {result.stderr.strip().splitlines()[-1]}')
+    parts = module.split('.')
+    packages = {'.'.join(parts[:i]) for i in range(1, len(parts) + 1)}
+    imports = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        imports.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+        # the module and its parent packages, interpreter startup imports are left out
+        if len(indent) == 1 and name in packages:
+            total += int(cumulative_us)
+    return {'total_ms': total / 1000, 'imports': imports}
+
+def check(module, budget_ms, path=None, repeat=3, top=10):
+    """Measure module repeat times and compare the median against budget
+
+    Args:
+        module (str): module to import
+        budget_ms (float): allowed import time in milliseconds
+        path (str, optional): working directory. Defaults to current directory.
+        repeat (int, optional): fresh imports to take the median of. Defaults to 3.
+        top (int, optional): heaviest imports to report. Defaults to 10.
+
+    Returns:
+        dict: module, budget_ms, median_ms, passed and heaviest imports by cumulative time
+    """
+    runs = [measure(module, path) for _ in range(repeat)]
+    median = statistics.median(run['total_ms'] for run in runs)
+    heaviest = sorted(runs[-1]['imports'], key=lambda i: i[2], reverse=True)[:top]
+    return {'module': module, 'budget_ms': budget_ms, 'median_ms': median, 'passed': median <= budget_ms, 'heaviest': heaviest}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the import time of pipeline entry points against a budget')
+    parser.add_argument('budgets', nargs='+', help='module=milliseconds, e.g. luigi_pipeline_example=300')
+    parser.add_argument('--path', default=None, help='directory the entry point runs from, defaults to current directory')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='heaviest imports to list per module')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for budget in args.budgets:
+        module, _, ms = budget.partition('=')
+        if not ms:
+            parser.error(f'budget {budget} is not module=milliseconds')
+        result = check(module, float(ms), args.path, args.repeat, args.top)
+        status = 'ok' if result['passed'] else 'over budget'
+        print(f"{module}: {result['median_ms']:.1f} ms of {result['budget_ms']:.0f} ms, {status}")
+        for name, self_ms, cumulative_ms in result['heaviest']:
+            print(f'    {cumulative_ms:9.1f} ms {self_ms:9.1f} ms  {name}')
+        failed = failed or not result['passed']
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,81 +1,137 @@
+import atexit
 import datetime
+import functools
 import os
 import logging
 import luigi
-import tomli
-import Example
-from DADPy.etl import db, performance
+from DADPy.etl import tasks
 from sys import exit
 
-# runtime variables
-with open('.\\config_example.toml', 'rb') as f:
-    config = tomli.load(f)
-log_path = config['paths']['log_path']
-export_path = config['paths']['export_path']
-server = config['database']['server']
-database = config['database']['database']
-ps_script = config['paths']['ps_script']
-database_luigi = config['database']['database_luigi']
+# only event handlers are registered at import, luigi workers and --help only pay for luigi and tasks.
+# config is read on first use, logging, Example, db and performance are set up on the
+# first task event of every process or by the task that needs them. Measured 180-250 ms
+# (luigi ~160 ms, tasks ~5 ms, no pandas, sqlalchemy or pyarrow) against DADPy.etl.db at
+# ~900 ms, with python 3.11, luigi 3.8 and pandas 2.1. Check with:
+#   python -m DADPy.etl.import_budget --path . --repeat 5 luigi_pipeline_example=300
 process_date = datetime.datetime.today().strftime('%Y%m%d-%H%M%S')
-
-# create log object
-log_file = os.path.join(log_path, f'Example_{process_date}.log')
-logging.basicConfig(filename=log_file, filemode='a', level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
 log = logging.getLogger()
+files = ['Example1.csv', 'Example2.csv']
+
+@functools.lru_cache(maxsize=None)
+def settings():
+    """Read runtime variables from config once
+
+    Returns:
+        dict: config_example.toml
+    """
+    import tomli
+    with open('.\\config_example.toml', 'rb') as f:
+        return tomli.load(f)
+
+def marker_dir():
+    return os.path.join(settings()['paths']['export_path'], 'markers')
+
+def pool():
+    """Connection pool settings of config, e.g.
+
+    [database.pool]
+    pool_size = 5
+    max_overflow = 10
+    pool_pre_ping = true
+    pool_recycle = 3600
+
+    Returns:
+        dict: engine_kwargs for get_engine, empty for its defaults
+    """
+    return dict(settings()['database'].get('pool', {}))
+
+@functools.lru_cache(maxsize=None)
+def setup():
+    """Create log object and performance tracker once per process, luigi worker processes
+    run it on their first task event
+
+    Returns:
+        tuple: MetricsSink and PerformanceTracker
+    """
+    from DADPy.etl import db, performance
+    config = settings()
+    log_path = config['paths']['log_path']
+    log_file = os.path.join(log_path, f'Example_{process_date}.log')
+    logging.basicConfig(filename=log_file, filemode='a', level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+    # track performance, metrics are kept in a local outbox until the database takes them
+    sink = performance.MetricsSink(os.path.join(log_path, 'metrics.sqlite'),
+                                   url=db.mssql_url(config['database']['server'], config['database']['database_luigi']),
+                                   log=log, engine_kwargs=pool())
+    pf = performance.PerformanceTracker('Example', interval=1.0, profile_dir=log_path, profile_interval=0.1, sink=sink,
+                                        engine_kwargs=pool())
+    # trackers still running at exit are stored as UNFINISHED
+    atexit.register(pf.close)
+    return sink, pf
+
+def track(event):
+    """Create a handler forwarding a luigi event to the performance tracker of this process
 
-# set up processing variables  
-Example_obj = Example.SourceData(export_path=export_path)
-destination_database = db.DADDatabase(server=server, database=database, log=log, schema='Example')
+    Args:
+        event (str): luigi event
 
-# track performance
-pf = performance.PerformanceTracker('Example', ps_script)
+    Returns:
+        function: event handler
+    """
+    def handler(task, *args):
+        setup()[1].handle(event, task, *args)
+    return handler
+
+# registered at import, not in main, so luigi worker processes started with spawn on
+# Windows track their tasks too. Task rows are written to the outbox as tasks end.
+for event in (luigi.Event.START, luigi.Event.PROCESSING_TIME, luigi.Event.SUCCESS, luigi.Event.FAILURE):
+    luigi.Task.event_handler(event)(track(event))
 
 class ExampleDownloadFile(luigi.Task):
     task_namespace = 'Example'
-    task_complete = False
+    date = luigi.DateParameter(default=datetime.date.today())
+
+    def output(self):
+        # one download per day, reruns on the same day reuse the files
+        return luigi.LocalTarget(os.path.join(marker_dir(), f'ExampleDownloadFile_{self.date:%Y%m%d}.done'))
+
     def run(self):
-        pid = pf.start(self.task_id)
+        import Example
         log.info('downloading source file from website')
+        Example_obj = Example.SourceData(export_path=settings()['paths']['export_path'])
         Example_obj.pull_data()
-        pf.end(pid)
-        self.task_complete = True
+        with self.output().open('w') as f:
+            f.write(process_date)
 
-    def complete(self):
-        return self.task_complete
-
-class ExampleUploadData(luigi.Task):
+class ExampleUploadFile(tasks.CsvUploadTask):
     task_namespace = 'Example'
-    task_complete = False
-    def run(self):
-        pid = pf.start(self.task_id)
-        log.info('uploading data')
-        files = ['Example1.csv', 'Example2.csv']
-        for f in files:
-            table = f'{f}'.replace('.csv','')
-            csv_adpt = db.ImportDbaCsvAdapter(log=log,
-                                   server=server,
-                                   database=database,
-                                   source=os.path.join(export_path, f),
-                                   target=table,
-                                   delimiter=",",
-                                   truncate=True,
-                                   schema='Example')
-            csv_adpt.upload_file()
-        pf.end(pid)
-        self.task_complete = True
-
-    def complete(self):
-        return self.task_complete
-    
+
     def requires(self):
         return ExampleDownloadFile()
 
+class ExampleUploadData(luigi.WrapperTask):
+    task_namespace = 'Example'
+
+    def requires(self):
+        config = settings()
+        # one task per file, run with --workers N to upload N files at a time
+        return [ExampleUploadFile(source_file=os.path.join(config['paths']['export_path'], f),
+                                  table=f.replace('.csv',''),
+                                  server=config['database']['server'],
+                                  database=config['database']['database'],
+                                  schema='Example',
+                                  delimiter='comma',
+                                  truncate=True,
+                                  marker_dir=marker_dir(),
+                                  engine_kwargs=pool()) for f in files]
+
 if __name__ == '__main__':
+    sink, pf = setup()
+    # only the main process sends the outbox to the database
+    sink.start()
     success = luigi.run()
+    # store metrics of failed runs too
+    pf.store_results(settings()['database']['server'], settings()['database']['database_luigi'])
+    sink.close()
     if success == False:
         exit(1)
-    pf.store_results(server, database_luigi)
-    for subproc in pf.terminals:
-        os.system("taskkill  /F /pid "+str(subproc['pid']))
-    exit(0)
-        
\ No newline at end of file
+    exit(0)
\ No newline at end of file
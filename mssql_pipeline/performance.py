@@ -1,37 +1,746 @@
 import subprocess
 import numpy as np
 import time
-import ast
 import os
 import signal
+import sys
+import re
+import json
+import sqlite3
+import logging
+import threading
+import itertools
+import functools
+import atexit
+from collections import Counter, deque
 import pandas as pd
-from sqlalchemy import create_engine
 from datetime import datetime
+from sqlalchemy import text
+from .db import get_engine, mssql_url
+from .memory import StageMemory
 
-class PerformanceTracker:
-    """Class to track Memory and CPU utilization during Luigi data pipelines.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def summarize_samples(values, digits=2):
+    """Summarize samples of one metric
+
+    Args:
+        values (list): numeric samples
+        digits (int, optional): decimals kept, None keeps them unrounded. Defaults to 2.
+
+    Returns:
+        dict: avg, max, p50, p95, p99 rounded to digits and count, statistics are None without samples
+    """
+    if len(values) == 0:
+        return {'avg': None, 'max': None, 'p50': None, 'p95': None, 'p99': None, 'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    stats = {'avg': float(np.average(values)), 'max': float(max(values)), 'p50': float(p50), 'p95': float(p95),
+             'p99': float(p99)}
+    if digits is not None:
+        stats = {stat: round(value, digits) for stat, value in stats.items()}
+    stats['count'] = len(values)
+    return stats
+
+class ResourceSampler:
+    """Class to sample CPU, memory, I/O and threads of a process and its children on a
+    background thread into a fixed size ring buffer. Uses psutil when installed and
+    reads /proc on Linux otherwise.
 
     Example:
 
-    pf_tracker = PerfomanceTracker('test','.\\capture_perf.ps1')
-    pid = pf_tracker.start()
+    sampler = ResourceSampler(interval=0.5)
+    sampler.start()
     --- your run code ---
-    pf_tracker.end(pid)
+    samples = sampler.stop()
+    """
+    def __init__(self, pid=None, interval=1.0, capacity=3600, children=True, on_sample=None):
+        """Instance Attributes
+
+        Args:
+            pid (int, optional): process to sample. Defaults to the current process.
+            interval (float, optional): seconds between samples. Defaults to 1.0.
+            capacity (int, optional): samples kept, the oldest are dropped first. Defaults to 3600.
+            children (bool, optional): include child processes. Defaults to True.
+            on_sample (callable, optional): called with every sample as it is taken. Defaults to None.
+
+        Raises:
+            OSError: neither psutil nor /proc is available
+        """
+        if psutil is None and not os.path.exists('/proc/self/stat'):
+            raise OSError('ResourceSampler needs psutil or /proc, install psutil')
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.children = children
+        self.on_sample = on_sample
+        self.buffer = deque(maxlen=capacity)
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = None
+        if psutil is None:
+            self._ticks = os.sysconf('SC_CLK_TCK')
+            self._page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def start(self):
+        """A method to take a baseline reading and start the sampling thread
+        """
+        self._last = self._read()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'resource-sampler-{self.pid}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """A method to stop the sampling thread after a final sample
+
+        Returns:
+            list: samples in the ring buffer, oldest first
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._record()
+        return list(self.buffer)
+
+    def samples(self):
+        """A method to return the ring buffer as a DataFrame
+
+        Returns:
+            pandas.DataFrame: one row per sample
+        """
+        return pd.DataFrame(list(self.buffer))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._record()
+
+    def _record(self):
+        """Private method to read counters and append the sample since the last reading
+        """
+        try:
+            reading = self._read()
+        except (OSError, ValueError):
+            # process ended between samples
+            return
+        elapsed = reading['ts'] - self._last['ts']
+        if elapsed <= 0:
+            return
+        sample = {'ts': datetime.fromtimestamp(reading['ts']),
+                  'cpu_percent': max(0.0, (reading['cpu_seconds'] - self._last['cpu_seconds']) / elapsed * 100),
+                  'rss_mb': reading['rss'] / 1024 ** 2,
+                  'read_mb': reading['read_bytes'] / 1024 ** 2,
+                  'write_mb': reading['write_bytes'] / 1024 ** 2,
+                  'threads': reading['threads'],
+                  'processes': reading['processes']}
+        self.buffer.append(sample)
+        self._last = reading
+        if self.on_sample is not None:
+            self.on_sample(sample)
+
+    def _read(self):
+        """Private method to read cumulative counters of the process and its children
+
+        Returns:
+            dict: timestamp, cpu seconds, rss bytes, read and write bytes, threads and processes
+        """
+        if psutil is not None:
+            return self._read_psutil()
+        return self._read_proc()
+
+    def _read_psutil(self):
+        root = psutil.Process(self.pid)
+        processes = [root] + (root.children(recursive=True) if self.children else [])
+        reading = {'ts': time.time(), 'cpu_seconds': 0.0, 'rss': 0, 'read_bytes': 0, 'write_bytes': 0, 'threads': 0, 'processes': 0}
+        for proc in processes:
+            try:
+                with proc.oneshot():
+                    cpu = proc.cpu_times()
+                    reading['cpu_seconds'] = reading['cpu_seconds'] + cpu.user + cpu.system
+                    if proc is root:
+                        # children that already exited
+                        reading['cpu_seconds'] = reading['cpu_seconds'] + cpu.children_user + cpu.children_system
+                    reading['rss'] = reading['rss'] + proc.memory_info().rss
+                    reading['threads'] = reading['threads'] + proc.num_threads()
+                    if hasattr(proc, 'io_counters'):
+                        counters = proc.io_counters()
+                        reading['read_bytes'] = reading['read_bytes'] + counters.read_bytes
+                        reading['write_bytes'] = reading['write_bytes'] + counters.write_bytes
+                reading['processes'] = reading['processes'] + 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                if proc is root:
+                    raise OSError(f'process {self.pid} is not available')
+        return reading
+
+    def _read_proc(self):
+        pids = [self.pid] + (self._proc_children() if self.children else [])
+        reading = {'ts': time.time(), 'cpu_seconds': 0.0, 'rss': 0, 'read_bytes': 0, 'write_bytes': 0, 'threads': 0, 'processes': 0}
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/stat', 'r') as f:
+                    stat = f.read()
+            except OSError:
+                if pid == self.pid:
+                    raise
+                continue
+            # fields after the command name, which can contain spaces
+            fields = stat[stat.rindex(')') + 2:].split()
+            ticks = int(fields[11]) + int(fields[12])
+            if pid == self.pid:
+                # children that already exited
+                ticks = ticks + int(fields[13]) + int(fields[14])
+            reading['cpu_seconds'] = reading['cpu_seconds'] + ticks / self._ticks
+            reading['threads'] = reading['threads'] + int(fields[17])
+            reading['rss'] = reading['rss'] + int(fields[21]) * self._page_size
+            try:
+                with open(f'/proc/{pid}/io', 'r') as f:
+                    for line in f:
+                        name, value = line.split(':')
+                        if name in ('read_bytes', 'write_bytes'):
+                            reading[name] = reading[name] + int(value)
+            except OSError:
+                # io counters need the same user or ptrace access
+                pass
+            reading['processes'] = reading['processes'] + 1
+        return reading
+
+    def _proc_children(self):
+        """Private method to find all descendants of the process in /proc
+
+        Returns:
+            list: child process ids
+        """
+        parents = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat', 'r') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            parents.setdefault(int(stat[stat.rindex(')') + 2:].split()[1]), []).append(int(entry))
+        children = []
+        pending = list(parents.get(self.pid, []))
+        while pending:
+            pid = pending.pop()
+            children.append(pid)
+            pending.extend(parents.get(pid, []))
+        return children
+
+class StackSampler:
+    """Class to sample the python stack of the thread that starts it on a background thread.
+    With all_threads every thread is sampled instead, leaving out threads blocked waiting on
+    a lock, queue or socket so idle helper threads do not bury the busy ones. Samples are
+    aggregated as collapsed stacks, so memory does not grow with run time. At a coarse
+    interval the overhead is low enough to leave on in production.
+
+    Example:
+
+    profiler = StackSampler(interval=0.05)
+    profiler.start()
+    --- your run code ---
+    profiler.stop()
+    profiler.write_collapsed('task.collapsed')
+    """
+    # threads of the trackers themselves are not profiled
+    ignored_threads = ('resource-sampler', 'powershell-reader', 'stack-sampler')
+    # innermost frames of threads blocked waiting, left out when every thread is sampled
+    idle_frames = {('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'),
+                   ('selectors.py', 'select'), ('socket.py', 'accept')}
+
+    def __init__(self, interval=0.05, max_depth=64, all_threads=False):
+        """Instance Attributes
+
+        Args:
+            interval (float, optional): seconds between samples. Defaults to 0.05.
+            max_depth (int, optional): innermost frames kept per stack. Defaults to 64.
+            all_threads (bool, optional): sample every busy thread instead of the thread calling start. Defaults to False.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.samples = 0
+        self._ident = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """A method to start the sampling thread, the calling thread is the one profiled
+        """
+        self._ident = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """A method to stop the sampling thread
+
+        Returns:
+            collections.Counter: sample count per collapsed stack
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        """Private method to add the current stack of the profiled thread, or of every busy thread
+        """
+        frames = sys._current_frames()
+        if not self.all_threads:
+            frames = {self._ident: frames[self._ident]} if self._ident in frames else {}
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            name = names.get(ident, str(ident))
+            if name.startswith(self.ignored_threads):
+                continue
+            if self.all_threads and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in self.idle_frames:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            stack.append(name)
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples = self.samples + 1
+
+    def hot_functions(self, top=10):
+        """A method to rank functions by the share of samples they were running in
+
+        Args:
+            top (int, optional): functions returned. Defaults to 10.
+
+        Returns:
+            list: tuples of function and percent of samples, highest first
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(function, round(count / total * 100, 1)) for function, count in leaves.most_common(top)]
+
+    def write_collapsed(self, file):
+        """A method to write collapsed stacks, the input format of flamegraph.pl and speedscope
+
+        Args:
+            file (str): output file
+        """
+        with open(file, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def write_speedscope(self, file, name='profile'):
+        """A method to write a speedscope sampled profile
+
+        Args:
+            file (str): output file
+            name (str, optional): profile name. Defaults to 'profile'.
+        """
+        frames = []
+        index = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            sample = []
+            for label in stack.split(';'):
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({'name': label})
+                sample.append(index[label])
+            samples.append(sample)
+            weights.append(round(count * self.interval, 6))
+        profile = {'$schema': 'https://www.speedscope.app/file-format-schema.json',
+                   'name': name,
+                   'activeProfileIndex': 0,
+                   'shared': {'frames': frames},
+                   'profiles': [{'type': 'sampled', 'name': name, 'unit': 'seconds', 'startValue': 0,
+                                 'endValue': round(sum(weights), 6), 'samples': samples, 'weights': weights}]}
+        with open(file, 'w', encoding='utf-8') as f:
+            json.dump(profile, f)
+
+class MetricsSink:
+    """Class to store metrics durably as they are produced and forward them to the database
+    in batches. Rows are buffered in memory, spilled every spill_interval to an append-only
+    SQLite outbox, and a background flusher sends outbox rows to the database every
+    flush_interval. Failed sends stay in the outbox and are retried with backoff, so
+    database outages never block tasks and rows of failed runs are sent by the next run.
+    Delivery is at least once. Several processes, e.g. Luigi workers, can share one outbox.
+
+    Every target table is sent in its own transaction. When a target fails while the
+    database is reachable, its rows are sent one by one and the rows the table rejects,
+    e.g. a column task_performance lacks before create_task_performance.sql was run, are
+    moved to the dead_letter table of the outbox with their error. Call requeue once the
+    table is fixed. The outbox keeps at most max_rows rows, the oldest are dropped with a warning.
+
+    Example:
+
+    sink = MetricsSink('C:\\Example_Data\\metrics.sqlite', url=mssql_url(server, database))
+    sink.start()
+    pf_tracker = PerformanceTracker('test', sink=sink)
+    --- luigi.run() ---
+    sink.close()
+    """
+    def __init__(self, path, url=None, schema='dbo', spill_interval=1.0, flush_interval=30.0, batch_rows=5000,
+                 max_backoff=600.0, max_rows=1000000, log=None, engine_kwargs=None):
+        """Instance Attributes
+
+        Args:
+            path (str): SQLite outbox file
+            url (str, optional): sqlalchemy url to forward to, rows stay in the outbox without one. Defaults to None.
+            schema (str, optional): database schema of the target tables. Defaults to 'dbo'.
+            spill_interval (float, optional): seconds between writes of buffered rows to the outbox. Defaults to 1.0.
+            flush_interval (float, optional): seconds between sends to the database. Defaults to 30.0.
+            batch_rows (int, optional): max outbox rows per send. Defaults to 5000.
+            max_backoff (float, optional): max seconds between retries while the database is down. Defaults to 600.0.
+            max_rows (int, optional): max outbox rows, None keeps all. Defaults to 1000000.
+            log (logging, optional): log for failed sends. Defaults to the module logger.
+            engine_kwargs (dict, optional): pool settings and other create_engine parameters, see get_engine. Defaults to None.
+        """
+        self.path = path
+        self.url = url
+        self.schema = schema
+        self.spill_interval = spill_interval
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.max_backoff = max_backoff
+        self.max_rows = max_rows
+        self.log = log or logging.getLogger(__name__)
+        self.engine_kwargs = engine_kwargs or {}
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._next_send = 0.0
+        con = self._connect()
+        try:
+            con.execute('pragma journal_mode=wal')
+            con.execute('create table if not exists outbox (id integer primary key autoincrement, target text not null, '
+                        'payload text not null)')
+            con.execute('create table if not exists dead_letter (id integer primary key, target text not null, '
+                        'payload text not null, error text, failed_at text)')
+            con.commit()
+        finally:
+            con.close()
+
+    def _connect(self):
+        """Private method to open an outbox connection, one per call so forked processes never share one
+
+        Returns:
+            sqlite3.Connection: outbox connection
+        """
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute('pragma synchronous=normal')
+        return con
+
+    def write(self, target, rows, durable=False):
+        """A method to add rows for a target table
+
+        Args:
+            target (str): target table
+            rows (list): row dictionaries
+            durable (bool, optional): write to the outbox now instead of buffering. Defaults to False.
+        """
+        payloads = [(target, json.dumps(row, default=str)) for row in rows]
+        with self._buffer_lock:
+            self._buffer.extend(payloads)
+        if durable:
+            self.spill()
+
+    def spill(self):
+        """A method to append buffered rows to the outbox in one transaction
+
+        Returns:
+            int: rows written
+        """
+        with self._buffer_lock:
+            payloads = self._buffer
+            self._buffer = []
+        if not payloads:
+            return 0
+        dropped = 0
+        con = self._connect()
+        try:
+            with con:
+                con.executemany('insert into outbox (target, payload) values (?, ?)', payloads)
+                if self.max_rows is not None:
+                    # ids only have gaps below the newest row, so this keeps at most max_rows
+                    dropped = con.execute('delete from outbox where id <= (select max(id) from outbox) - ?',
+                                          (self.max_rows,)).rowcount
+        finally:
+            con.close()
+        if dropped:
+            self.log.warning(f'metrics outbox is over {self.max_rows} rows, dropped the {dropped} oldest')
+        return len(payloads)
+
+    def send(self):
+        """A method to forward outbox rows to the database in batches, rows are removed after they are committed.
+        Rows a reachable database rejects are moved to the dead_letter table, so they never block the outbox
+
+        Raises:
+            Exception: database error while the database is unreachable, unsent rows stay in the outbox
+
+        Returns:
+            int: rows sent
+        """
+        if self.url is None:
+            return 0
+        sent = 0
+        with self._send_lock:
+            engine = get_engine(self.url, **self.engine_kwargs)
+            while True:
+                con = self._connect()
+                try:
+                    rows = con.execute('select id, target, payload from outbox order by id limit ?', (self.batch_rows,)).fetchall()
+                finally:
+                    con.close()
+                if not rows:
+                    return sent
+                targets = {}
+                for row in rows:
+                    targets.setdefault(row[1], []).append(row)
+                for target, items in targets.items():
+                    try:
+                        self._insert(engine, target, items)
+                    except Exception:
+                        # an outage is retried with backoff, a rejecting target is sent row by row
+                        if not self._reachable(engine):
+                            raise
+                        sent = sent + self._send_rows(engine, target, items)
+                        continue
+                    self._remove(items)
+                    sent = sent + len(items)
+
+    def _insert(self, engine, target, items):
+        """Private method to insert outbox rows of one target table in one transaction
+
+        Args:
+            engine (sqlalchemy.engine): database engine
+            target (str): target table
+            items (list): outbox rows as id, target and payload
+        """
+        df = pd.DataFrame([json.loads(item[2]) for item in items])
+        if 'ts' in df.columns:
+            df['ts'] = pd.to_datetime(df['ts'])
+        with engine.begin() as db_con:
+            df.to_sql(name=target, con=db_con, schema=self.schema, method=None, if_exists='append', index=False)
+
+    def _send_rows(self, engine, target, items):
+        """Private method to send rows of a failed target one by one and dead letter the rejected rows
+
+        Args:
+            engine (sqlalchemy.engine): database engine
+            target (str): target table
+            items (list): outbox rows as id, target and payload
+
+        Raises:
+            Exception: database error while the database is unreachable
+
+        Returns:
+            int: rows sent
+        """
+        sent = []
+        rejected = []
+        try:
+            for item in items:
+                try:
+                    self._insert(engine, target, [item])
+                except Exception as e:
+                    if not self._reachable(engine):
+                        raise
+                    rejected.append((item, str(e)[:4000]))
+                    continue
+                sent.append(item)
+        finally:
+            # keep the progress made before an outage
+            self._remove(sent, rejected)
+        if rejected:
+            self.log.warning(f'{len(rejected)} metrics rows rejected by {target}, moved to dead_letter in '
+                             f'{self.path}: {rejected[0][1]}')
+        return len(sent)
+
+    @staticmethod
+    def _reachable(engine):
+        """Private method to tell an outage from rows the database rejects
+
+        Args:
+            engine (sqlalchemy.engine): database engine
+
+        Returns:
+            bool: True if the database answers a query
+        """
+        try:
+            with engine.connect() as db_con:
+                db_con.execute(text('select 1'))
+        except Exception:
+            return False
+        return True
+
+    def _remove(self, items, rejected=()):
+        """Private method to delete sent rows from the outbox and move rejected rows to dead_letter
+
+        Args:
+            items (list): sent outbox rows as id, target and payload
+            rejected (list, optional): rejected outbox rows and their errors. Defaults to ().
+        """
+        if not items and not rejected:
+            return
+        failed_at = datetime.today().isoformat(sep=' ', timespec='seconds')
+        con = self._connect()
+        try:
+            with con:
+                con.executemany('insert into dead_letter (target, payload, error, failed_at) values (?, ?, ?, ?)',
+                                [(item[1], item[2], error, failed_at) for item, error in rejected])
+                con.executemany('delete from outbox where id = ?',
+                                [(item[0],) for item in items] + [(item[0],) for item, _ in rejected])
+        finally:
+            con.close()
+
+    def requeue(self, target=None):
+        """A method to move dead letters back to the outbox, e.g. after the target table was upgraded
+
+        Args:
+            target (str, optional): only requeue rows of this target table. Defaults to None for all.
+
+        Returns:
+            int: rows requeued
+        """
+        where, params = ('where target = ?', (target,)) if target is not None else ('', ())
+        con = self._connect()
+        try:
+            with con:
+                con.execute(f'insert into outbox (target, payload) select target, payload from dead_letter {where} '
+                            'order by id', params)
+                requeued = con.execute(f'delete from dead_letter {where}', params).rowcount
+        finally:
+            con.close()
+        return requeued
+
+    def flush(self):
+        """A method to spill buffered rows and try one send, a failed send is logged and retried later
+
+        Returns:
+            int: rows sent
+        """
+        self.spill()
+        try:
+            sent = self.send()
+        except Exception as e:
+            self._failures = self._failures + 1
+            backoff = min(self.max_backoff, self.flush_interval * 2 ** self._failures)
+            self._next_send = time.monotonic() + backoff
+            self.log.warning(f'metrics send failed, retrying in {backoff:.0f}s: {e}')
+            return 0
+        self._failures = 0
+        self._next_send = time.monotonic() + self.flush_interval
+        return sent
+
+    def start(self):
+        """A method to start the background flusher
+        """
+        self._stop.clear()
+        self._next_send = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.spill_interval):
+            try:
+                if time.monotonic() >= self._next_send:
+                    self.flush()
+                else:
+                    self.spill()
+            except Exception as e:
+                # a full disk or locked outbox must not kill the flusher
+                self.log.warning(f'metrics spill failed: {e}')
+
+    def close(self):
+        """A method to stop the flusher and make a last attempt to send, unsent rows stay in the outbox
+
+        Returns:
+            int: rows sent by the last attempt
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.flush()
+
+class PerformanceTracker:
+    """Class to track Memory and CPU utilization during Luigi data pipelines. By default
+    a ResourceSampler measures this process and its children, cpu is percent of one core
+    and memory is resident MB. With ps_script the PowerShell script measures system wide
+    cpu and committed memory percent instead.
+
+    With profile_dir the thread running every task is also profiled by a StackSampler. Collapsed stacks and a
+    speedscope profile are written to profile_dir as <task_id>.collapsed and
+    <task_id>.speedscope.json, and the top functions are stored in hot_functions.
+
+    With memory_stages the allocations of every task are traced, pass pf_tracker.memory as
+    memory_tracker to MyDatabase to attribute them to its stages. The stage summary is
+    stored in memory_stages. Tasks that run at the same time in one process share the trace.
+
+    With a MetricsSink every sample and task row is written to the sink as it is produced,
+    so metrics of failed runs are kept. Samples go to task_performance_samples.
+
+    Example:
+
+    pf_tracker = PerfomanceTracker('test', profile_dir=log_path)
+    pf_tracker.register()
     --- luigi.run() ---
     pf_tracker.store_results('server_test', 'database_test')
+
+    or track code by hand:
+
+    pid = pf_tracker.start(task_id)
+    --- your run code ---
+    pf_tracker.end(pid)
     """
-    def __init__(self, task_family, ps_script):
+    def __init__(self, task_family, ps_script=None, interval=1.0, capacity=3600, profile_dir=None, profile_interval=0.05,
+                 profile_top=10, memory_stages=False, memory_sites=False, sink=None,
+                 engine_kwargs=None):
         """Instance Attributes
 
         Args:
             task_family (str): Luigi task family
-            ps_script (str): path and file for powershell script
+            ps_script (str, optional): path and file for powershell script. Defaults to None.
+            interval (float, optional): seconds between samples of the in process sampler. Defaults to 1.0.
+            capacity (int, optional): samples kept per task by the in process sampler. Defaults to 3600.
+            profile_dir (str, optional): profile every task and write its profiles here. Defaults to None.
+            profile_interval (float, optional): seconds between stack samples. Defaults to 0.05.
+            profile_top (int, optional): functions stored in hot_functions. Defaults to 10.
+            memory_stages (bool, optional): trace allocations per task with a StageMemory. Defaults to False.
+            memory_sites (bool, optional): also record the top allocating call sites of every stage. Defaults to False.
+            sink (MetricsSink, optional): write samples and task rows as they are produced. Defaults to None.
+            engine_kwargs (dict, optional): pool settings and other create_engine parameters used by store_results,
+                see get_engine. Defaults to None.
         """
         self.task_family = task_family
-        self.ps_script = self._validate_ps_file(ps_script)
+        self.ps_script = self._validate_ps_file(ps_script) if ps_script is not None else None
+        self.interval = interval
+        self.capacity = capacity
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+        self.profile_top = profile_top
+        self.memory = StageMemory(sites=memory_sites) if memory_stages else None
+        self.sink = sink
+        self.engine_kwargs = engine_kwargs or {}
         self.workers = []
         self.terminals = []
         self.data = []
+        self._ids = itertools.count(1)
+        self._running = {}
+        self._registered = False
 
     def _validate_ps_file(self, file):
         """Private method to validate if file exists
@@ -65,101 +774,217 @@ class PerformanceTracker:
                 "task_id": task_id,
                 "cpu_avg": None,
                 "cpu_max": None,
+                "cpu_p50": None,
+                "cpu_p95": None,
+                "cpu_p99": None,
                 "mem_avg": None, 
                 "mem_max": None,
+                "mem_p50": None,
+                "mem_p95": None,
+                "mem_p99": None,
                 "total_measurements": None,
+                "wall_seconds": None,
+                "processing_seconds": None,
+                "status": None,
+                "error": None,
+                "hot_functions": None,
+                "memory_stages": None,
                 "ts": None
               }
         # start tracking
-        ps_process = PowershellTracker(self.ps_script)
-        ps_process.start()
-        # add tracking info and subprocess to collections
-        info["process_id"] = ps_process.proc.pid
+        if self.ps_script is not None:
+            ps_process = PowershellTracker(self.ps_script)
+            ps_process.start()
+            # add tracking info and subprocess to collections
+            info["process_id"] = ps_process.proc.pid
+            terminal = {'pid': ps_process.proc.pid, 'subprocess': ps_process, 'info': info}
+        else:
+            on_sample = None
+            if self.sink is not None:
+                def on_sample(sample):
+                    self.sink.write('task_performance_samples', [{'task_id': task_id, **sample}])
+            sampler = ResourceSampler(interval=self.interval, capacity=self.capacity, on_sample=on_sample)
+            sampler.start()
+            # several tasks can share this process, so the sampler gets its own id
+            info["process_id"] = sampler.pid
+            terminal = {'pid': next(self._ids), 'subprocess': sampler, 'info': info}
+        if self.profile_dir is not None:
+            terminal['profiler'] = StackSampler(interval=self.profile_interval)
+            terminal['profiler'].start()
+        if self.memory is not None:
+            # stages of tasks still running in this process are kept
+            if not self.terminals:
+                self.memory.reset()
+            self.memory.start()
+        terminal['started'] = time.perf_counter()
         self.workers.append(info)
-        self.terminals.append({'pid': ps_process.proc.pid, 'subprocess': ps_process})
-        return ps_process.proc.pid
+        self.terminals.append(terminal)
+        return terminal['pid']
 
-    def end(self, worker_id):
+    def end(self, worker_id, status=None, error=None):
         """A method to stop collecting memory and cpu usage results, and kill subprocess 
 
         Args:
             worker_id (str): process id to identify subprocess
+            status (str, optional): task outcome, e.g. SUCCESS or FAILURE. Defaults to None.
+            error (str, optional): error message of a failed task. Defaults to None.
         """
         # filter for correct task
-        task_item = next(item for item in self.workers if item["process_id"] == worker_id)
-        terminal_item = next(item['subprocess'] for item in self.terminals if item["pid"] == worker_id)
+        terminal = next(item for item in self.terminals if item["pid"] == worker_id)
+        self.terminals.remove(terminal)
+        task_item = terminal['info']
+        terminal_item = terminal['subprocess']
+        task_item['wall_seconds'] = round(time.perf_counter() - terminal['started'], 3)
+        task_item['status'] = status
+        task_item['error'] = error
         # collect data
-        tracking_stream =  terminal_item.end(worker_id)
-        results_formatted = self._format_ps_results(tracking_stream)
-        cpu = results_formatted['cpu']
-        memory = results_formatted['memory']
-        # calculate avg and max
-        task_item['cpu_avg'] = 999 if len(cpu) == 0  else "{:.2f}".format(np.average(cpu))
-        task_item['cpu_max'] = 999 if len(cpu) == 0 else max(cpu)
-        task_item['mem_avg'] = 999 if len(memory) == 0  else "{:.2f}".format(np.average(memory))
-        task_item['mem_max'] = 999 if len(memory) == 0 else max(memory)
-        task_item['total_measurements'] = len(cpu) + len(memory)
+        if isinstance(terminal_item, ResourceSampler):
+            samples = terminal_item.stop()
+            stats = {'cpu': summarize_samples([s['cpu_percent'] for s in samples]),
+                     'memory': summarize_samples([s['rss_mb'] for s in samples])}
+        else:
+            stats = terminal_item.end(worker_id)
+        # statistics stay NULL when no samples were collected
+        for prefix, metric in (('cpu', 'cpu'), ('mem', 'memory')):
+            for stat in ('avg', 'max', 'p50', 'p95', 'p99'):
+                task_item[f'{prefix}_{stat}'] = stats[metric][stat]
+        task_item['total_measurements'] = stats['cpu']['count']
+        if 'profiler' in terminal:
+            task_item['hot_functions'] = self._write_profile(terminal['profiler'], task_item['task_id'])
+        if self.memory is not None:
+            summary = self.memory.summary()
+            task_item['memory_stages'] = summary[:4000] if summary is not None else None
+            # keep tracing while other tasks of this process are running
+            if not self.terminals:
+                self.memory.stop()
         task_item["ts"] = datetime.today()
         self.data.append(task_item)
+        if self.sink is not None:
+            # durable now, a Luigi worker process can exit right after the task
+            self.sink.write('task_performance', [task_item], durable=True)
 
-    def _format_ps_results(self, results):
-        """Private method to format results from powershell
+    def _write_profile(self, profiler, task_id):
+        """Private method to stop a task profiler and write its profiles to profile_dir
 
         Args:
-            results (io.BufferedReader): stream containing results from subprocess
+            profiler (StackSampler): running profiler of task
+            task_id (str): Luigi task_id
 
         Returns:
-            list: list of tuples
+            str: top functions with percent of samples, separated by newlines
         """
-        result_clean = {}
-        memory = []
-        cpu = []
-        # loop through stream and append valid numerical measurements
-        items = results.readlines()
-        items_clean = [ast.literal_eval(i.decode('utf-8').strip()) for i in items]
-        for measure in items_clean:
-            if measure[0] == 999 or measure[1] == 999:
-                continue
-            else:
-                cpu.append(float(measure[0]))
-                memory.append(float(measure[1]))
-        result_clean['cpu'] = cpu
-        result_clean ['memory'] = memory
-        return result_clean
-    
+        profiler.stop()
+        name = re.sub(r'[^\w.-]', '_', task_id)
+        profiler.write_collapsed(os.path.join(self.profile_dir, f'{name}.collapsed'))
+        profiler.write_speedscope(os.path.join(self.profile_dir, f'{name}.speedscope.json'), name=task_id)
+        return '\n'.join(f'{percent}% {function}' for function, percent in profiler.hot_functions(self.profile_top))[:4000]
+
+    def register(self, task_class=None):
+        """A method to track every Luigi task automatically through its START, SUCCESS, FAILURE
+        and PROCESSING_TIME events, instead of calling start and end in each task. Failed tasks
+        are stored with status FAILURE and the error, and trackers still running at exit are
+        stopped. Handlers run in the process that runs the task, so with more than one Luigi
+        worker process the results stay in the workers.
+
+        Args:
+            task_class (luigi.Task, optional): tasks to track, subclasses included. Defaults to luigi.Task.
+        """
+        import luigi
+        if self._registered:
+            return
+        self._registered = True
+        task_class = task_class or luigi.Task
+        for event in (luigi.Event.START, luigi.Event.PROCESSING_TIME, luigi.Event.SUCCESS, luigi.Event.FAILURE):
+            task_class.event_handler(event)(functools.partial(self.handle, event))
+        atexit.register(self.close)
+
+    def handle(self, event, task, *args):
+        """A method to track a task from one of its Luigi events. register attaches it to every task,
+        scripts whose Luigi worker processes never run register can forward the events themselves
+
+        Args:
+            event (str): Luigi event START, PROCESSING_TIME, SUCCESS or FAILURE
+            task (luigi.Task): task of the event
+            args: processing time of PROCESSING_TIME or exception of FAILURE
+        """
+        import luigi
+        if event == luigi.Event.START:
+            self._running[task.task_id] = self.start(task.task_id)
+        elif event == luigi.Event.PROCESSING_TIME:
+            handle = self._running.get(task.task_id)
+            if handle is not None:
+                # luigi time of run() only, wall_seconds also covers event handling
+                self.log_processing_time(handle, args[0])
+        elif event == luigi.Event.SUCCESS:
+            handle = self._running.pop(task.task_id, None)
+            if handle is not None:
+                self.end(handle, status='SUCCESS')
+        elif event == luigi.Event.FAILURE:
+            handle = self._running.pop(task.task_id, None)
+            if handle is not None:
+                exception = args[0]
+                self.end(handle, status='FAILURE', error=f'{type(exception).__name__}: {exception}'[:4000])
+
+    def log_processing_time(self, worker_id, processing_time):
+        """A method to record the run time measured by Luigi for a running task
+
+        Args:
+            worker_id (int): id returned by start
+            processing_time (float): seconds spent in run()
+        """
+        terminal = next(item for item in self.terminals if item["pid"] == worker_id)
+        terminal['info']['processing_seconds'] = round(processing_time, 3)
+
+    def close(self):
+        """A method to stop every tracker that is still running, they are stored with status UNFINISHED
+        """
+        for terminal in list(self.terminals):
+            self.end(terminal['pid'], status='UNFINISHED')
+        self._running.clear()
+
     def store_results(self, server, database):
-        """A Method to store results in SQL Server
+        """A Method to store results in SQL Server. Create or upgrade the table with create_task_performance.sql.
+        With a sink the rows were written as tasks ended, and this only tries to send them.
 
         Args:
             server (str): database server
             database (str): database name
         """
-        engine = create_engine(
-            'mssql+pyodbc://' + server + '/' + database + '?trusted_connection=yes&driver=SQL+Server&TrustServerCertificate=yes&Encrypt=yes',
-            fast_executemany=True)
+        # trackers of tasks that never finished are stored too
+        self.close()
+        if self.sink is not None:
+            self.sink.flush()
+            return
+        engine = get_engine(mssql_url(server, database), **self.engine_kwargs)
         df = pd.DataFrame(self.data)
         df.to_sql(name='task_performance', con=engine, schema='dbo', method=None, if_exists='append', index=False)
 
 class PowershellTracker:
-    """Class to run PowerShell script for tracking performance
+    """Class to run PowerShell script for tracking performance. A reader thread parses
+    samples from the script output as they arrive, so end returns without waiting.
 
     Example:
 
     ps_tracker = PowershellTracker('.\\capture_perf.ps1')
-    id = ps_tracker.start()
-    results = ps_tracker.end(id)
+    ps_tracker.start()
+    stats = ps_tracker.end(ps_tracker.proc.pid)
     """
-    def __init__(self, ps_script):
+    def __init__(self, ps_script, interval_ms=500):
         """Instance attributes
 
         Args:
             ps_script (str): path and file for script
+            interval_ms (int, optional): milliseconds between samples in the script. Defaults to 500.
         """
-        self.id = id
         self.ps_script = ps_script
+        self.interval_ms = interval_ms
+        self.cpu = []
+        self.memory = []
+        self._lock = threading.Lock()
+        self._reader = None
 
     def start(self):
-        """A method to launch backgroup subprocess to track metrics
+        """A method to launch backgroup subprocess to track metrics and a thread reading its output
 
         Raises:
             e: Error launching subprocess
@@ -170,20 +995,46 @@ class PowershellTracker:
                                             "-ExecutionPolicy", 
                                             "Bypass", 
                                             "-File", 
-                                            f"{self.ps_script}"],
-                                        shell=False, start_new_session=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                                            f"{self.ps_script}",
+                                            "-IntervalMs",
+                                            str(self.interval_ms)],
+                                        shell=False, start_new_session=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         except subprocess.CalledProcessError as e:
             raise e
+        self._reader = threading.Thread(target=self._read_output, name=f'powershell-reader-{self.proc.pid}', daemon=True)
+        self._reader.start()
 
+    def _read_output(self):
+        """Private method to drain the script output into memory as samples arrive. Lines
+        look like (cpu,memory), samples with a 999 sentinel or that fail to parse are skipped.
+        """
+        for line in self.proc.stdout:
+            try:
+                cpu, memory = (float(value) for value in line.decode('utf-8').strip().strip('()').split(','))
+            except ValueError:
+                continue
+            if cpu == 999 or memory == 999:
+                continue
+            with self._lock:
+                self.cpu.append(cpu)
+                self.memory.append(memory)
 
     def end(self, pid):
-        """A method to collect subprocess output and terminate subprocess
+        """A method to terminate subprocess and summarize the samples collected so far
+
+        Args:
+            pid (int): process id of subprocess
 
         Returns:
-            io.BufferedReader: Stream of performance measurements
+            dict: summarize_samples statistics for cpu and memory
         """
-        # rest script for n sec to ensure PowerShell has time to collect data
-        time.sleep(5)
-        stdout = self.proc.stdout
-        os.kill(pid, signal.SIGTERM)
-        return stdout
\ No newline at end of file
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            # script already exited
+            pass
+        if self._reader is not None:
+            # the pipe closes with the process, this only waits for the last line
+            self._reader.join(timeout=1)
+        with self._lock:
+            return {'cpu': summarize_samples(list(self.cpu)), 'memory': summarize_samples(list(self.memory))}
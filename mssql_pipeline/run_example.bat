@@ -1 +1 @@
-cmd /c "C: & cd C:\Python_Environments\Example\Scripts & activate & cd C:\Example_Data\Scripts & python luigi_pipeline_example.py --scheduler-host localhost Example.ExampleUploadData"
\ No newline at end of file
+cmd /c "C: & cd C:\Python_Environments\Example\Scripts & activate & cd C:\Example_Data\Scripts & python luigi_pipeline_example.py --scheduler-host localhost Example.ExampleUploadData --workers 2"
\ No newline at end of file
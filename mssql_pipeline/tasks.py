@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import tempfile
+from abc import abstractmethod
+import luigi
+
+# db imports pandas and sqlalchemy, it is imported when a task runs so scheduling and
+# listing tasks stay cheap
+
+class FingerprintTarget(luigi.Target):
+    """Luigi target that exists while a marker file holds the current fingerprint of a
+    source file. Completion survives restarts, and a changed source makes the task run
+    again. exists only compares size and mtime and never writes, Luigi checks it from the
+    scheduler and every worker at the same time. A new mtime makes the task run, and
+    FingerprintTask.run hashes the source to skip the load when only the mtime changed.
+
+    Example:
+
+    target = FingerprintTarget('C:\\Example_Data\\markers\\Example1.done', 'C:\\Example_Data\\Example1.csv')
+    fingerprint = target.fingerprint()
+    --- load source ---
+    target.mark(fingerprint)
+    """
+    def __init__(self, path, source):
+        """Constructor for class
+
+        Args:
+            path (str): marker file
+            source (str): source file
+        """
+        self.path = path
+        self.source = source
+
+    def fingerprint(self):
+        """Fingerprint source, take it before loading so changes during the load run the task again
+
+        Returns:
+            dict: size, mtime and sha256 of source
+        """
+        from .db import LoadManifest
+        return LoadManifest.fingerprint(self.source)
+
+    def marked(self):
+        """Read marker
+
+        Returns:
+            dict: fingerprint of the last load, None without marker
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def exists(self):
+        marked = self.marked()
+        if marked is None or not os.path.exists(self.source):
+            return False
+        stat = os.stat(self.source)
+        return marked['size'] == stat.st_size and marked['mtime'] == stat.st_mtime
+
+    def mark(self, fingerprint=None):
+        """Write marker for source
+
+        Args:
+            fingerprint (dict, optional): fingerprint taken before loading. Defaults to fingerprint of source now.
+        """
+        fingerprint = fingerprint or self.fingerprint()
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        # write then rename so a crash never leaves a partial marker, every writer gets its own tmp file
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=os.path.basename(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({**fingerprint, 'source': os.path.abspath(self.source)}, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+class FingerprintTask(luigi.Task):
+    """Base task for loading one source file. The task is complete while its marker matches
+    the source fingerprint and its requirements are complete, so reruns skip files that were
+    already loaded but still see files replaced by an upstream task. Subclasses implement
+    source and load.
+    """
+    marker_dir = luigi.Parameter()
+
+    @abstractmethod
+    def source(self):
+        """Source file of task
+
+        Returns:
+            str: path of source file
+        """
+
+    @abstractmethod
+    def load(self):
+        """Load source file
+        """
+
+    def output(self):
+        return FingerprintTarget(os.path.join(self.marker_dir, f'{self.task_id}.done'), self.source())
+
+    def complete(self):
+        # an incomplete upstream task may replace the source, so check it first
+        if not all(task.complete() for task in luigi.task.flatten(self.requires())):
+            return False
+        return super().complete()
+
+    def run(self):
+        target = self.output()
+        # fingerprint before loading so changes during the load run the task again
+        fingerprint = target.fingerprint()
+        marked = target.marked()
+        if marked is None or marked['sha256'] != fingerprint['sha256']:
+            self.load()
+        # an unchanged source, e.g. rewritten by an upstream task, only gets its new mtime
+        target.mark(fingerprint)
+
+class CsvUploadTask(FingerprintTask):
+    """Upload one csv file with BulkCsvImporter. Schedule one task per file so
+    --workers N uploads N files at a time.
+
+    Example:
+
+    class ExampleUploadData(luigi.WrapperTask):
+        def requires(self):
+            return [CsvUploadTask(source_file=f, table=f.replace('.csv', ''), server=server, database=database,
+                                  marker_dir=marker_dir, truncate=True) for f in files]
+    """
+    source_file = luigi.Parameter()
+    table = luigi.Parameter()
+    server = luigi.Parameter()
+    database = luigi.Parameter()
+    schema = luigi.Parameter(default='dbo')
+    delimiter = luigi.Parameter(default='comma')
+    truncate = luigi.BoolParameter(default=False)
+    # pool settings, see get_engine, they do not change what the task loads
+    engine_kwargs = luigi.DictParameter(default={}, significant=False)
+
+    def source(self):
+        return self.source_file
+
+    def load(self):
+        from .db import BulkCsvImporter, mssql_url
+        importer = BulkCsvImporter(log=logging.getLogger(),
+                                   url=mssql_url(self.server, self.database),
+                                   source=self.source_file,
+                                   target=self.table,
+                                   delimiter=self.delimiter,
+                                   truncate=self.truncate,
+                                   schema=self.schema,
+                                   engine_kwargs=dict(self.engine_kwargs))
+        importer.upload_file()
@@ -0,0 +1,90 @@
+import importlib.util
+import logging
+import os
+import pytest
+
+pytest.importorskip('pandas')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+
+# mssql_pipeline is installed as DADPy.etl, load db.py from the source tree
+spec = importlib.util.spec_from_file_location('db', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db.py'))
+db = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db)
+
+FILE_KWARGS = {'sep': ',', 'dtype': str, 'chunksize': 10}
+
+
+class CommitFailure(Exception):
+    pass
+
+
+def make_load(tmp_path, rows=35):
+    url = f"sqlite:///{tmp_path / 'load.sqlite'}"
+    file = str(tmp_path / 'load.csv')
+    with open(file, 'w', newline='') as f:
+        f.write('id,name\n' + ''.join(f'{i},name {i}\n' for i in range(rows)))
+    database = db.MyDatabase(None, None, logging.getLogger(), schema=None, url=url)
+    with database.engine.begin() as con:
+        con.execute('create table target (id varchar(10), name varchar(20))')
+    return database, file
+
+
+def count(database):
+    with database.engine.connect() as con:
+        return con.execute('select count(*) from target').scalar()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_file_checkpoint_not_saved_when_commit_fails(tmp_path, workers):
+    database, file = make_load(tmp_path)
+    checkpoint = db.FileCheckpoint()
+    commits = []
+
+    def fail_second_commit(con):
+        commits.append(con)
+        if len(commits) == 2:
+            raise CommitFailure('commit failed')
+
+    sqlalchemy.event.listen(database.engine, 'commit', fail_second_commit)
+    try:
+        with pytest.raises(CommitFailure):
+            database.update_database('target', file, file_kwargs=FILE_KWARGS, workers=workers, checkpoint=checkpoint)
+    finally:
+        sqlalchemy.event.remove(database.engine, 'commit', fail_second_commit)
+    # every recorded batch has its rows in the table, the failed batch is not recorded
+    recorded = checkpoint.load('target', file)
+    assert len(recorded) < 4
+    assert sum(item['rows'] for item in recorded.values()) == count(database)
+
+    # rerun loads the remaining batches once
+    database.update_database('target', file, file_kwargs=FILE_KWARGS, workers=workers, checkpoint=checkpoint)
+    assert count(database) == 35
+    with database.engine.connect() as con:
+        assert con.execute('select count(distinct id) from target').scalar() == 35
+    assert not os.path.exists(file + '.checkpoint.json')
+    db.dispose_engines()
+
+
+def test_file_checkpoint_keeps_tables_and_files_apart(tmp_path):
+    first, second = tmp_path / 'first.csv', tmp_path / 'second.csv'
+    first.write_text('id\n1\n2\n')
+    second.write_text('id\n3\n4\n5\n')
+    shared = tmp_path / 'shared.checkpoint.json'
+    checkpoint = db.FileCheckpoint(str(shared))
+    checkpoint.save('target', str(first), 0, 3, 7, 2, 2)
+    checkpoint.save('target', str(second), 0, 3, 9, 3, 3)
+    checkpoint.save('other', str(first), 0, 3, 7, 2, 2)
+    assert checkpoint.load('target', str(first))[0]['end'] == 7
+    assert checkpoint.load('target', str(second))[0]['end'] == 9
+
+    # finishing one load keeps the others
+    checkpoint.clear('target', str(second))
+    assert checkpoint.load('target', str(second)) == {}
+    assert checkpoint.load('target', str(first)) and checkpoint.load('other', str(first))
+
+    # a rewritten source is loaded from its start
+    first.write_text('id\n10\n20\n30\n')
+    assert checkpoint.load('target', str(first)) == {}
+    checkpoint.clear('target', str(first))
+    checkpoint.clear('other', str(first))
+    assert not shared.exists()
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+pytest.importorskip('sqlalchemy')
+
+# mssql_pipeline is installed as DADPy.etl, load db.py from the source tree
+spec = importlib.util.spec_from_file_location('db', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db.py'))
+db = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(db)
+
+
+@pytest.mark.parametrize('nrows', [None, 0, 25, 30, 200])
+def test_arrow_chunks_stop_at_nrows_like_c(tmp_path, nrows):
+    file = str(tmp_path / 'rows.csv')
+    with open(file, 'w', newline='') as f:
+        f.write('id,name\n' + ''.join(f'{i},name {i}\n' for i in range(100)))
+    file_kwargs = {'sep': ',', 'dtype': str, 'chunksize': 10}
+    if nrows is not None:
+        file_kwargs['nrows'] = nrows
+    arrow = [len(chunk) for chunk in db.make_reader(file_kwargs, 'arrow').chunks(file)]
+    c = [len(chunk) for chunk in db.make_reader(file_kwargs, 'c').chunks(file)]
+    assert arrow == c
+    assert sum(arrow) == min(nrows if nrows is not None else 100, 100)
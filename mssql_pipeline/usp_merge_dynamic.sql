@@ -1,6 +1,6 @@
 /*
 Procedure: dbo.usp_dynamic_merge
-Purpose: To dynamically build T-SQL merge statement from z_staging_dynamic to target table.
+Purpose: To dynamically build T-SQL merge statement from z_staging_dynamic, or a per run staging table, to target table.
 		 Client must specify target table and which column/columns to merge in z_merge_columns table
 		 Ensure staging data is in the same ordinal position as data in the target table.
 
@@ -8,9 +8,13 @@ Examples:
 	1 column to merge on		
 		exec usp_dynamic_merge 'my_target_table'
 
+	per run staging table
+		exec usp_dynamic_merge 'my_target_table', '[dbo].[z_staging_my_target_table_1a2b3c4d]'
+
 */
 CREATE PROCEDURE [dbo].[usp_dynamic_merge]
-	@target AS VARCHAR(MAX)
+	@target AS VARCHAR(MAX),
+	@source AS VARCHAR(MAX) = 'z_staging_dynamic'
 	AS
 	SET NOCOUNT ON;
 
@@ -30,7 +34,7 @@ CREATE PROCEDURE [dbo].[usp_dynamic_merge]
 
 	SET @sql = 'MERGE ' + @target + ' AS Target'
 				+  CHAR(13) +
-				'USING z_staging_dynamic AS Source '
+				'USING ' + @source + ' AS Source '
 				+ CHAR(13) +
 				+ 'ON ' +   REPLACE(STUFF((SELECT ', ' +'Source.'+ r2.source_col + ' = ' + 'Target.' + r2.target_col
 							FROM @result2 r2
@@ -54,7 +58,7 @@ CREATE PROCEDURE [dbo].[usp_dynamic_merge]
 							FOR XML PATH(''), TYPE).value('.','nvarchar(max)'),1,2,'') + ';'
 					+ CHAR(13) +
 					+ CHAR(13) +
-					'TRUNCATE TABLE z_staging_dynamic;'
+					'TRUNCATE TABLE ' + @source + ';'
 					
 	exec (@sql)
 GO
\ No newline at end of file